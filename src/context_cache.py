@@ -0,0 +1,175 @@
+"""Gemini explicit context caching for the static system prompts.
+
+When enabled, each static system prompt is uploaded once with
+``client.caches.create`` and later requests reference it by name, sending
+only the per-call data. Cache names are persisted on disk keyed by a hash of
+the model and prefix, so reruns within the TTL reuse the same server-side
+cache. Prefixes the API refuses to cache (for example because they are below
+the model's minimum cacheable size) are remembered for the rest of the run
+and sent inline as before.
+
+Gemini 2.5 Flash only caches prefixes of at least 1,024 tokens. The current
+system prompts are all well below that (about 100-500 tokens at ~4
+characters per token), so for now every prefix is refused and sent inline.
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+import orjson
+
+from src.llm_cache import DEFAULT_CACHE_DIR
+
+# Kept in the per-user cache directory next to the response cache, so the
+# map does not depend on the working directory
+DEFAULT_NAMES_PATH = DEFAULT_CACHE_DIR / "context_caches.json"
+DEFAULT_TTL_SECONDS = 60 * 60
+
+# Stop using a cache this long before it expires so in-flight requests never
+# reference a cache that has just been deleted
+_EXPIRY_MARGIN_SECONDS = 60
+
+# Path of the on-disk name map, or None while context caching is disabled
+_names_path: Optional[Path] = None
+_ttl_seconds: int = DEFAULT_TTL_SECONDS
+
+# Cache name per key for this run; None marks a prefix that could not be cached
+_names: dict[str, Optional[str]] = {}
+_pending: dict[str, asyncio.Future] = {}
+
+
+def enable(names_path: Path = DEFAULT_NAMES_PATH, ttl_seconds: int = DEFAULT_TTL_SECONDS) -> None:
+    """Enable explicit context caching.
+
+    Args:
+        names_path: JSON file mapping prefix hashes to server-side cache names
+        ttl_seconds: Lifetime of newly created caches in seconds
+    """
+    global _names_path, _ttl_seconds
+    _names_path = Path(names_path)
+    _ttl_seconds = ttl_seconds
+
+
+def disable() -> None:
+    """Disable explicit context caching and forget cache names from this run."""
+    global _names_path
+    _names_path = None
+    _names.clear()
+
+
+def is_enabled() -> bool:
+    """Return True if explicit context caching is enabled."""
+    return _names_path is not None
+
+
+def _cache_key(prefix: str, model: str) -> str:
+    """Compute the key identifying a prefix/model pair."""
+    return hashlib.sha256(f"{model}\0{prefix}".encode()).hexdigest()
+
+
+def _load_names() -> dict:
+    """Read the on-disk name map, treating a missing or corrupt file as empty."""
+    try:
+        return orjson.loads(_names_path.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        return {}
+
+
+def _lookup(key: str) -> tuple[bool, Optional[str]]:
+    """Find a usable cache name from this run or from disk.
+
+    Returns:
+        Tuple of (found, cache name); a found None means caching was refused
+    """
+    if key in _names:
+        return True, _names[key]
+    entry = _load_names().get(key)
+    if entry and entry.get("expiresAt", 0) - _EXPIRY_MARGIN_SECONDS > time.time():
+        _names[key] = entry["name"]
+        return True, entry["name"]
+    return False, None
+
+
+def _store(key: str, name: Optional[str], model: str) -> None:
+    """Remember a cache name for this run and persist it for later runs."""
+    _names[key] = name
+    if name is None:
+        return
+
+    names = _load_names()
+    names[key] = {"name": name, "model": model, "expiresAt": time.time() + _ttl_seconds}
+    _names_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = _names_path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_bytes(orjson.dumps(names))
+    os.replace(tmp_path, _names_path)
+
+
+def _create_config(prefix: str) -> dict:
+    """Build the caches.create config holding a prefix as the system instruction."""
+    return {"system_instruction": prefix, "ttl": f"{_ttl_seconds}s"}
+
+
+def get_cache_name(client, model: str, prefix: str) -> Optional[str]:
+    """Return the name of a server-side cache holding prefix, creating it if needed.
+
+    Args:
+        client: Initialized Gemini client
+        model: Model the cache is created for
+        prefix: Static prompt prefix to cache
+
+    Returns:
+        The cache name, or None if caching is disabled or the API refused it
+    """
+    if _names_path is None:
+        return None
+
+    key = _cache_key(prefix, model)
+    found, name = _lookup(key)
+    if found:
+        return name
+
+    try:
+        cache = client.caches.create(model=model, config=_create_config(prefix))
+        name = cache.name
+    except Exception as e:
+        print(f"[CACHE] Context caching unavailable for this prompt, sending it inline: {e}")
+        name = None
+    _store(key, name, model)
+    return name
+
+
+async def get_cache_name_async(client, model: str, prefix: str) -> Optional[str]:
+    """Async variant of get_cache_name.
+
+    Concurrent callers asking for the same prefix wait for a single
+    caches.create request instead of each creating their own cache.
+    """
+    if _names_path is None:
+        return None
+
+    key = _cache_key(prefix, model)
+    found, name = _lookup(key)
+    if found:
+        return name
+    if key in _pending:
+        return await _pending[key]
+
+    future = asyncio.get_running_loop().create_future()
+    _pending[key] = future
+    name = None
+    try:
+        try:
+            cache = await client.aio.caches.create(model=model, config=_create_config(prefix))
+            name = cache.name
+        except Exception as e:
+            print(f"[CACHE] Context caching unavailable for this prompt, sending it inline: {e}")
+        _store(key, name, model)
+        return name
+    finally:
+        # Always release waiters, even if persisting the name failed
+        del _pending[key]
+        future.set_result(name)
@@ -0,0 +1,100 @@
+"""Helpers for working with JSON text produced by the LLM."""
+
+from typing import Optional
+
+
+def looks_complete(text: str) -> bool:
+    """Cheap check that accumulated JSON text could be a complete document.
+
+    A complete object or array ends in '}' or ']'; anything else is still
+    streaming or was truncated, so there is no point attempting a parse.
+    """
+    stripped = text.rstrip()
+    return bool(stripped) and stripped[-1] in '}]'
+
+
+class JSONArrayItemParser:
+    """Incrementally extract the objects of the first JSON array in a text stream.
+
+    Feed chunks of a document such as ``{"claims": [{...}, {...}]}`` as they
+    arrive; each call returns the raw JSON text of every array element that
+    the chunk completed. Only object elements are reported, which is all the
+    LLM responses in this project contain.
+    """
+
+    def __init__(self):
+        self._depth = 0
+        self._array_depth: Optional[int] = None
+        self._array_closed = False
+        self._in_string = False
+        self._escaped = False
+        # Pieces of the element currently being read, joined once it closes
+        self._item_parts: list[str] = []
+        self._in_item = False
+
+    def feed(self, chunk: str) -> list[str]:
+        """Consume the next chunk of text.
+
+        Args:
+            chunk: Next piece of the JSON document
+
+        Returns:
+            Raw JSON text of each array element completed in this chunk
+        """
+        items = []
+        item_start = 0 if self._in_item else None
+
+        for i, char in enumerate(chunk):
+            if self._in_string or char == '"':
+                self._scan_string(char)
+            elif char in '{[':
+                if self._open(char):
+                    item_start = i
+            elif char in '}]' and self._close(char):
+                self._item_parts.append(chunk[item_start:i + 1])
+                items.append("".join(self._item_parts))
+                self._item_parts = []
+                item_start = None
+
+        if self._in_item and item_start is not None:
+            self._item_parts.append(chunk[item_start:])
+        return items
+
+    def _scan_string(self, char: str) -> None:
+        """Track string and escape state so brackets inside strings are ignored."""
+        if not self._in_string:
+            self._in_string = True
+        elif self._escaped:
+            self._escaped = False
+        elif char == '\\':
+            self._escaped = True
+        elif char == '"':
+            self._in_string = False
+
+    def _open(self, char: str) -> bool:
+        """Enter a nested object or array.
+
+        Returns:
+            True if this bracket starts a new element of the tracked array
+        """
+        starts_item = char == '{' and self._depth == self._array_depth and not self._array_closed
+        if starts_item:
+            self._in_item = True
+        self._depth += 1
+        if char == '[' and self._array_depth is None:
+            self._array_depth = self._depth
+        return starts_item
+
+    def _close(self, char: str) -> bool:
+        """Leave a nested object or array.
+
+        Returns:
+            True if this bracket completes the current array element
+        """
+        self._depth -= 1
+        if char == '}' and self._in_item and self._depth == self._array_depth:
+            self._in_item = False
+            return True
+        if char == ']' and self._array_depth is not None and self._depth < self._array_depth:
+            self._array_closed = True
+        return False
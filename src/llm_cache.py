@@ -0,0 +1,127 @@
+"""On-disk cache for LLM responses keyed by prompt and model."""
+
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+import orjson
+
+# Bump whenever the prompt templates change so stale responses are not replayed
+PROMPT_VERSION = "7"
+
+# Per-user location so every checkout and working directory shares one cache
+DEFAULT_CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "learning-agents"
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+
+# Cache directory in use, or None while the cache is disabled
+_cache_dir: Optional[Path] = None
+_ttl_seconds: int = DEFAULT_TTL_SECONDS
+
+
+def enable(cache_dir: Path = DEFAULT_CACHE_DIR, ttl_seconds: int = DEFAULT_TTL_SECONDS) -> None:
+    """Enable the response cache.
+
+    Args:
+        cache_dir: Directory where cache entries are stored
+        ttl_seconds: Lifetime of newly written entries in seconds
+    """
+    global _cache_dir, _ttl_seconds
+    _cache_dir = Path(cache_dir)
+    _ttl_seconds = ttl_seconds
+
+
+def disable() -> None:
+    """Disable the response cache; get() misses and set() is a no-op."""
+    global _cache_dir
+    _cache_dir = None
+
+
+def is_enabled() -> bool:
+    """Return True if the response cache is enabled."""
+    return _cache_dir is not None
+
+
+def _cache_key(prompt: str, model: str) -> str:
+    """Compute the content-addressable key for a prompt/model pair.
+    
+    Each field is prefixed with its 8-byte length, so no choice of model and
+    prompt text can produce the same byte stream as a different pair.
+    """
+    digest = hashlib.sha256()
+    for field in (PROMPT_VERSION, model, prompt):
+        data = field.encode()
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def get(prompt: str, model: str) -> Optional[str]:
+    """Look up a cached response.
+
+    Expired or unreadable entries are evicted and treated as a miss.
+
+    Args:
+        prompt: The exact prompt sent to the model
+        model: Model name the prompt was sent to
+
+    Returns:
+        The cached response text, or None on a miss
+    """
+    if _cache_dir is None:
+        return None
+
+    path = _cache_dir / f"{_cache_key(prompt, model)}.json"
+    try:
+        entry = orjson.loads(path.read_bytes())
+    except FileNotFoundError:
+        return None
+    except (OSError, orjson.JSONDecodeError):
+        path.unlink(missing_ok=True)
+        return None
+
+    if entry.get("expiresAt", 0) < time.time():
+        path.unlink(missing_ok=True)
+        return None
+    return entry.get("response")
+
+
+def set(prompt: str, model: str, response_text: str) -> None:
+    """Store a response in the cache.
+
+    Args:
+        prompt: The exact prompt sent to the model
+        model: Model name the prompt was sent to
+        response_text: Raw response text returned by the model
+    """
+    if _cache_dir is None:
+        return
+
+    _cache_dir.mkdir(parents=True, exist_ok=True)
+    now = time.time()
+    entry = {
+        "model": model,
+        "promptVersion": PROMPT_VERSION,
+        "response": response_text,
+        "createdAt": now,
+        "expiresAt": now + _ttl_seconds
+    }
+
+    # Write to a temp file and rename so concurrent readers never see partial JSON
+    path = _cache_dir / f"{_cache_key(prompt, model)}.json"
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_bytes(orjson.dumps(entry))
+    os.replace(tmp_path, path)
+
+
+def delete(prompt: str, model: str) -> None:
+    """Evict a cached response, e.g. one that no longer parses.
+
+    Args:
+        prompt: The exact prompt sent to the model
+        model: Model name the prompt was sent to
+    """
+    if _cache_dir is None:
+        return
+    (_cache_dir / f"{_cache_key(prompt, model)}.json").unlink(missing_ok=True)
@@ -1,15 +1,452 @@
 """Main application module."""
 
+from __future__ import annotations
+
+import io
 import os
+import re
 import sys
-import json
-from google import genai
+import glob
+import time
+import asyncio
+import argparse
+import importlib.util
+from contextlib import redirect_stdout
+from contextvars import ContextVar
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, AsyncIterator, Callable, NamedTuple, Optional, TextIO, TypeVar, Union
+import orjson
+from pydantic import BaseModel, ValidationError
+from src import context_cache, llm_cache
+from src.json_utils import JSONArrayItemParser, looks_complete
 from src.models import (
-    FNOLInfo, DamageInfo, VehicleInfo, BatchFNOLInfo,
+    FNOLInfo, BatchFNOLInfo, ExtractionAssessment, ExtractionReview, ReviewIssue,
     SeverityAssessment, BatchSeverityAssessment,
-    QueueRouting, BatchQueueRouting
+    QueueRouting, BatchQueueRouting, PipelineResult, ValidationSummary, SEVERITIES, fast_build
+)
+
+if TYPE_CHECKING:
+    # Imported lazily in _get_client(); pulling in the SDK costs hundreds of
+    # milliseconds that --help and input error paths never need
+    from google import genai
+
+MODEL_NAME = "gemini-2.5-flash"
+
+# Upper bound on in-flight Gemini requests when fanning out per-claim calls
+MAX_CONCURRENT_REQUESTS = 32
+
+# Total attempts (initial call + retries) when a response fails schema validation
+MAX_VALIDATION_ATTEMPTS = 3
+
+# Above this many claims Stage II falls back to one batched call
+MAX_PER_CLAIM_FANOUT = 100
+
+# Connection pool of the shared client's HTTP transport. The default httpx
+# pool keeps only 20 idle connections alive for 5s, so bursts of concurrent
+# requests keep reopening TLS connections.
+HTTP_MAX_CONNECTIONS = 200
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 64
+HTTP_KEEPALIVE_EXPIRY_SECONDS = 300.0
+
+# Multiplex concurrent requests over one HTTP/2 connection when the optional
+# h2 package is installed (pip install 'httpx[http2]'); HTTP/1.1 otherwise
+HTTP2_ENABLED = importlib.util.find_spec("h2") is not None
+
+# Requests rejected for quota (429) or overload (503) are retried by the SDK
+# with exponential backoff: 10s, 20s, 40s
+API_RETRY_ATTEMPTS = 4
+API_RETRY_INITIAL_DELAY_SECONDS = 10.0
+API_RETRY_STATUS_CODES = [429, 503]
+
+# A request still running after this long is abandoned and reissued with a
+# 1.5x longer timeout; Gemini's latency has a long tail and a fresh request
+# usually beats waiting on a stuck one. Set via --request-timeout (0 disables).
+REQUEST_TIMEOUT_SECONDS = 30.0
+REQUEST_TIMEOUT_ATTEMPTS = 3
+_request_timeout: Optional[float] = REQUEST_TIMEOUT_SECONDS
+
+# Stage III routing table: queue and priority per severity. Minor damage
+# confined to glazing goes to the 'glass' queue instead.
+_SEVERITY_QUEUES = {"Minor": "fast_track", "Moderate": "material_damage", "Major": "total_loss"}
+_SEVERITY_PRIORITIES = {"Major": 1, "Moderate": 3, "Minor": 4}
+# Minor damage is glass-only when it names glazing as a whole word and no
+# other part of the vehicle, so "fiberglass" or "windshield and rear bumper"
+# do not qualify
+_GLASS_TERMS_RE = re.compile(r"\b(?:glass|windshields?|windscreens?|windows?)\b")
+_NON_GLASS_TERMS_RE = re.compile(
+    r"\b(?:bumpers?|doors?|fenders?|hood|bonnet|trunk|boot|tailgate|panels?|roof|tires?|tyres?|wheels?|rims?"
+    r"|hubcaps?|(?:head|tail|fog)?lights?|lamps?|grilles?|mirrors?|frame|axles?|suspension|engine|radiator"
+    r"|airbags?|body|paint|undercarriage|dents?|dented)\b"
 )
 
+# Rough characters-per-token ratio used to estimate prompt size without a tokenizer
+CHARS_PER_TOKEN = 4
+
+# Input files above this size get a warning; consider --max-tokens for them
+LARGE_INPUT_BYTES = 1 << 20
+
+# Gemini responses are constrained to the response schema, but are still
+# validated on arrival. FNOL_VALIDATE=0 trusts the schema and builds the
+# models without validation, which is cheaper on large batches.
+VALIDATE_RESPONSES = os.environ.get("FNOL_VALIDATE", "1") != "0"
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+class _Prompt(NamedTuple):
+    """A request split into its static system instruction and per-call data."""
+    system_instruction: str
+    contents: str
+
+
+# Instruction blocks shared by the per-stage prompts and the combined prompt.
+# Kept dense: every character here is re-sent as input tokens on each call.
+_EXTRACTION_INSTRUCTIONS = """For EACH claim in the text extract:
+- claim_id: unique claim identifier, if mentioned
+- incident_date: date and time of the incident
+- incident_location: physical/geographic place only (e.g. "highway", "grocery store", "intersection");
+  null if only an event is given (e.g. "in a hailstorm")
+- policyholder_name: name of the policyholder/customer
+- contact_phone, contact_email
+- vehicle: {make, model, year, vin, license_plate, color}
+- damage: {description: ONLY the physical damage, not its cause (e.g. "dented rear bumper and broken taillight",
+  NOT "someone hit my car and dented..."); location: specific vehicle parts affected (e.g. "windshield",
+  "rear bumper", "driver side doors"); severity: minor, moderate or severe, inferred from the damage extent;
+  estimated_repair_cost: number only}
+- incident_description: full description of how the incident occurred (may copy the original text)
+- other_parties_involved, police_report_filed: booleans, inferred from context when not explicit
+Extract ALL available information. Use null only for information that is truly absent and not inferable. No extra fields."""
+
+_SEVERITY_GUIDELINES = """- Minor: $100-$1,000; small cosmetic damage, minor scratches, small chips
+- Moderate: $1,000-$5,000; significant body damage, broken parts, multiple areas affected
+- Major: $5,000-$50,000; severe structural damage, airbag deployment, vehicle not drivable, extensive damage"""
+
+# Static system prompts. Every instruction lives here and each request sends
+# only its data as contents, so consecutive requests share a byte-identical
+# system instruction that the API can serve from its prompt cache. Prompt
+# builders return the two separately (see _Prompt).
+_STAGE_I_SYSTEM_PROMPT = f"""You are an insurance claims processing assistant. The user message is FNOL text containing
+multiple First Notice of Loss (FNOL) claims; extract structured information from it.
+{_EXTRACTION_INSTRUCTIONS}
+Return ONLY a JSON object {{"claims":[{{...claim 1...}},{{...claim 2...}}]}} with no markdown or extra text.
+"""
+
+_STAGE_II_HEADER = f"""You are an insurance claims severity assessment specialist. For each claim in the user message,
+classify the damage in loss_desc and damage_area as 'Minor', 'Moderate' or 'Major' and estimate the repair cost
+(estimated_cost) as a float.
+{_SEVERITY_GUIDELINES}
+"""
+
+_STAGE_II_SYSTEM_PROMPT = _STAGE_II_HEADER + """Return ONLY a JSON object with one assessment per claim:
+{"assessments":[{"claim_id":"...","severity":"Minor|Moderate|Major","estimated_cost":0.0,"reasoning":"brief explanation"}]}
+"""
+
+_STAGE_II_CLAIM_SYSTEM_PROMPT = _STAGE_II_HEADER + """The user message is a single claim. Return ONLY its assessment:
+{"claim_id":"...","severity":"Minor|Moderate|Major","estimated_cost":0.0,"reasoning":"brief explanation"}
+"""
+
+_COMBINED_SYSTEM_PROMPT = f"""You are an insurance claims processing assistant. The user message is FNOL text containing
+multiple First Notice of Loss (FNOL) claims. Process it in two steps and return the results of both steps in one JSON object.
+STEP 1 - EXTRACTION
+{_EXTRACTION_INSTRUCTIONS}
+STEP 2 - SEVERITY: classify each claim's damage as 'Minor', 'Moderate' or 'Major' from its damage description and
+location, with an estimated_cost float and brief reasoning.
+{_SEVERITY_GUIDELINES}
+Return "claims" and "assessments" arrays. assessments must have exactly one entry per claim, in claim order, using the
+claim's claim_id (or "CLAIM-<n>" for the n-th claim when no ID is given).
+"""
+
+_REVIEW_SYSTEM_PROMPT = """You are a quality assurance reviewer for insurance claims extraction. The user message holds
+the original FNOL text and the data extracted from it. Review the extraction against the text for: missing information
+that should have been extracted; incorrect or inaccurate values; fields that could be more complete; inconsistencies with
+the text; JSON structure problems.
+Return ONLY a JSON object: {"feedback":"overall assessment","issues":[{"claim_id":"...","field":"...","issue":"the problem",
+"suggestion":"correction or addition"}],"json_valid":true,"overall_quality_score":1-10}
+Scoring: 10 perfect (all available info extracted, valid JSON, all rules followed); 9 excellent, only minor wording
+preferences; 8 one or two small issues; 7 or below missing data or rule violations. Be pragmatic: information absent from
+the text (like incident_date) is acceptable; only deduct for information that WAS available but not extracted, or rule
+violations.
+"""
+
+_REFINEMENT_SYSTEM_PROMPT = """You are an insurance claims processor refining an extraction based on feedback. The user
+message holds the original FNOL text, the current extraction, any reviewer feedback, and rule violations found by automatic
+checks. Produce an improved extraction that addresses ALL issues, without adding fields or text that are not in the original.
+Return ONLY a JSON object {"claims":[{...improved claim 1...},{...improved claim 2...}]} with no markdown or extra text.
+"""
+
+_CLIENT: Optional[genai.Client] = None
+
+
+@lru_cache(maxsize=None)
+def _schema_json(schema: type[BaseModel]) -> bytes:
+    """Generate a model's JSON schema once and keep it serialized."""
+    return orjson.dumps(schema.model_json_schema())
+
+
+def _json_config(schema: type) -> dict:
+    """Build a generation config that constrains the output to the given model's JSON schema.
+    
+    Passing the model class would make the SDK regenerate its JSON schema on
+    every request. The cached schema is decoded into a fresh dict per call
+    instead, because the SDK rewrites the dict it is given in place.
+    """
+    return {"response_mime_type": "application/json", "response_schema": orjson.loads(_schema_json(schema))}
+
+
+def _get_client() -> genai.Client:
+    """Return the shared Gemini client, creating it on first use.
+    
+    Reusing one client keeps its underlying HTTP connection pool warm across
+    all stages and concurrent requests; the pool is sized by the HTTP_*
+    constants so concurrent requests do not queue for a connection.
+    
+    Raises:
+        ValueError: If GOOGLE_API_KEY environment variable is not set
+    """
+    global _CLIENT
+    if _CLIENT is None:
+        api_key = os.environ.get("GOOGLE_API_KEY")
+        if not api_key:
+            raise ValueError(
+                "GOOGLE_API_KEY environment variable is not set. "
+                "Get your API key from https://aistudio.google.com/app/apikey"
+            )
+        import httpx
+        from google import genai
+        limits = httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS
+        )
+        http_args = {"limits": limits, "http2": HTTP2_ENABLED}
+        # An explicit transport keeps async requests on httpx. With aiohttp
+        # installed the SDK would otherwise switch to it, ignoring the pool
+        # settings and raising aiohttp errors instead of httpx timeouts.
+        async_http_args = {"transport": httpx.AsyncHTTPTransport(**http_args)}
+        _CLIENT = genai.Client(
+            api_key=api_key,
+            http_options=genai.types.HttpOptions(
+                client_args=http_args,
+                async_client_args=async_http_args,
+                retry_options=genai.types.HttpRetryOptions(
+                    attempts=API_RETRY_ATTEMPTS,
+                    initial_delay=API_RETRY_INITIAL_DELAY_SECONDS,
+                    exp_base=2.0,
+                    http_status_codes=API_RETRY_STATUS_CODES
+                )
+            )
+        )
+    return _CLIENT
+
+
+def _request_config(config: Optional[dict], system_instruction: str, cache_name: Optional[str]) -> dict:
+    """Attach the system instruction to a generation config.
+    
+    The instruction is referenced through its context cache when one exists,
+    and sent inline otherwise; the API rejects requests that set both.
+    """
+    if cache_name:
+        return {**(config or {}), "cached_content": cache_name}
+    return {**(config or {}), "system_instruction": system_instruction}
+
+
+def _timeout_config(config: Optional[dict], timeout: float) -> dict:
+    """Add a per-attempt HTTP timeout to a generation config.
+    
+    The timeout applies to each HTTP attempt, so time spent in the SDK's own
+    429/503 backoff between attempts does not count against it.
+    """
+    return {**(config or {}), "http_options": {"timeout": int(timeout * 1000)}}
+
+
+def _generate_text(
+    client: genai.Client,
+    system_instruction: str,
+    contents: Union[str, list[genai.types.Content]],
+    config: Optional[dict] = None
+) -> str:
+    """Send a prompt to Gemini and return the response text.
+    
+    Requests that exceed the request timeout are reissued with a longer
+    timeout. The response cache is handled by _generate_validated, which only
+    stores responses once they parse.
+    
+    Args:
+        client: Initialized Gemini client
+        system_instruction: Static system prompt, sent via its context cache when enabled
+        contents: Prompt text, or a user/model conversation (see _retry_contents)
+        config: Optional generation config (e.g. structured-output settings)
+    """
+    cache_name = context_cache.get_cache_name(client, MODEL_NAME, system_instruction)
+    request_config = _request_config(config, system_instruction, cache_name)
+    if not _request_timeout:
+        response = client.models.generate_content(
+            model=MODEL_NAME,
+            contents=contents,
+            config=request_config
+        )
+        return response.text
+    
+    import httpx
+    timeout = _request_timeout
+    for attempt in range(REQUEST_TIMEOUT_ATTEMPTS):
+        try:
+            response = client.models.generate_content(
+                model=MODEL_NAME,
+                contents=contents,
+                config=_timeout_config(request_config, timeout)
+            )
+            return response.text
+        except httpx.TimeoutException:
+            if attempt == REQUEST_TIMEOUT_ATTEMPTS - 1:
+                raise
+            print(f"[RETRY] Gemini request timed out after {timeout:.0f}s, reissuing...")
+            timeout *= 1.5
+
+
+async def _generate_text_async(
+    client: genai.Client,
+    system_instruction: str,
+    contents: Union[str, list[genai.types.Content]],
+    config: Optional[dict] = None
+) -> str:
+    """Async variant of _generate_text using the client's aio interface."""
+    cache_name = await context_cache.get_cache_name_async(client, MODEL_NAME, system_instruction)
+    request_config = _request_config(config, system_instruction, cache_name)
+    if not _request_timeout:
+        response = await client.aio.models.generate_content(
+            model=MODEL_NAME,
+            contents=contents,
+            config=request_config
+        )
+        return response.text
+    
+    import httpx
+    timeout = _request_timeout
+    for attempt in range(REQUEST_TIMEOUT_ATTEMPTS):
+        try:
+            response = await client.aio.models.generate_content(
+                model=MODEL_NAME,
+                contents=contents,
+                config=_timeout_config(request_config, timeout)
+            )
+            return response.text
+        except httpx.TimeoutException:
+            if attempt == REQUEST_TIMEOUT_ATTEMPTS - 1:
+                raise
+            print(f"[RETRY] Gemini request timed out after {timeout:.0f}s, reissuing...")
+            timeout *= 1.5
+
+
+def _parse_response(schema: type[ModelT], response_text: str) -> ModelT:
+    """Parse a schema-constrained response into the given model.
+    
+    Responses are validated unless FNOL_VALIDATE=0, in which case they are
+    trusted to match the response schema and built without validation.
+    """
+    if VALIDATE_RESPONSES:
+        return schema.model_validate_json(response_text)
+    data = orjson.loads(response_text)
+    if not isinstance(data, dict):
+        # Not even the right shape; let validation produce the error to feed back
+        return schema.model_validate(data)
+    return fast_build(schema, data)
+
+
+def _retry_contents(prompt: _Prompt, response_text: str, error: ValueError) -> list[genai.types.Content]:
+    """Build the follow-up conversation that shows the model its invalid output and the error.
+    
+    The invalid output is sent back as the model's own turn, so the request
+    is a user/model/user conversation rather than one user message.
+    """
+    from google.genai import types
+    turns = [
+        ("user", prompt.contents),
+        ("model", response_text),
+        ("user", f"Your output had error: {error}. Fix and return ONLY valid JSON matching the schema.")
+    ]
+    return [types.Content(role=role, parts=[types.Part.from_text(text=text)]) for role, text in turns]
+
+
+def _contents_cache_key(system_instruction: str, contents: Union[str, list[genai.types.Content]]) -> str:
+    """Build the response cache key for a prompt or conversation."""
+    turns = [contents] if isinstance(contents, str) else [turn.parts[0].text for turn in contents]
+    return "\0".join([system_instruction, *turns])
+
+
+def _parse_cached(schema: type[ModelT], cache_key: str, response_text: str, from_cache: bool) -> ModelT:
+    """Parse a response and keep the response cache in step with the result.
+    
+    Fresh responses are cached only once they parse, so an invalid reply is
+    never replayed on later runs; a cached reply that no longer parses (for
+    example after a schema change) is evicted.
+    """
+    try:
+        result = _parse_response(schema, response_text)
+    except (ValidationError, orjson.JSONDecodeError):
+        if from_cache:
+            llm_cache.delete(cache_key, MODEL_NAME)
+        raise
+    if not from_cache:
+        llm_cache.set(cache_key, MODEL_NAME, response_text)
+    return result
+
+
+def _generate_validated(client: genai.Client, prompt: _Prompt, schema: type[ModelT]) -> ModelT:
+    """Generate schema-constrained JSON and validate it into the given model.
+    
+    Identical prompts are served from the on-disk response cache when it is
+    enabled. If validation fails, the invalid output and the validation error
+    are sent back to the model so it can correct itself, with a short linear
+    backoff between attempts that reached the API.
+    
+    Args:
+        client: Initialized Gemini client
+        prompt: System instruction and contents to send
+        schema: Pydantic model the response must match
+        
+    Returns:
+        Validated instance of schema
+        
+    Raises:
+        ValueError: If the response still does not match the schema after all attempts
+    """
+    contents: Union[str, list[genai.types.Content]] = prompt.contents
+    for attempt in range(MAX_VALIDATION_ATTEMPTS):
+        cache_key = _contents_cache_key(prompt.system_instruction, contents)
+        response_text = llm_cache.get(cache_key, MODEL_NAME)
+        from_cache = response_text is not None
+        if not from_cache:
+            response_text = _generate_text(client, prompt.system_instruction, contents, _json_config(schema))
+        try:
+            return _parse_cached(schema, cache_key, response_text, from_cache)
+        except (ValidationError, orjson.JSONDecodeError) as e:
+            if attempt == MAX_VALIDATION_ATTEMPTS - 1:
+                raise ValueError(f"Failed to create {schema.__name__} object: {e}\nResponse: {response_text}")
+            contents = _retry_contents(prompt, response_text, e)
+            if not from_cache:
+                time.sleep(1.0 * (attempt + 1))
+
+
+async def _generate_validated_async(client: genai.Client, prompt: _Prompt, schema: type[ModelT]) -> ModelT:
+    """Async variant of _generate_validated."""
+    contents: Union[str, list[genai.types.Content]] = prompt.contents
+    for attempt in range(MAX_VALIDATION_ATTEMPTS):
+        cache_key = _contents_cache_key(prompt.system_instruction, contents)
+        response_text = llm_cache.get(cache_key, MODEL_NAME)
+        from_cache = response_text is not None
+        if not from_cache:
+            response_text = await _generate_text_async(client, prompt.system_instruction, contents, _json_config(schema))
+        try:
+            return _parse_cached(schema, cache_key, response_text, from_cache)
+        except (ValidationError, orjson.JSONDecodeError) as e:
+            if attempt == MAX_VALIDATION_ATTEMPTS - 1:
+                raise ValueError(f"Failed to create {schema.__name__} object: {e}\nResponse: {response_text}")
+            contents = _retry_contents(prompt, response_text, e)
+            if not from_cache:
+                await asyncio.sleep(1.0 * (attempt + 1))
+
 
 def extract_fnol_information_batch(raw_text: str, enable_feedback_loop: bool = False) -> BatchFNOLInfo:
     """Extract structured FNOL information from raw text containing multiple claims.
@@ -21,6 +458,9 @@ def extract_fnol_information_batch(raw_text: str, enable_feedback_loop: bool = F
     If feedback loop is enabled, the LLM will review its own extraction and
     provide feedback, then refine the extraction based on that feedback.
     
+    Input that is already BatchFNOLInfo JSON is validated directly and
+    skips the extraction call.
+    
     Args:
         raw_text: Raw text containing one or more FNOL claims
         enable_feedback_loop: If True, enables LLM self-review and refinement (default: False)
@@ -32,116 +472,224 @@ def extract_fnol_information_batch(raw_text: str, enable_feedback_loop: bool = F
         ValueError: If GOOGLE_API_KEY environment variable is not set
         Exception: If the API request fails
     """
-    api_key = os.environ.get("GOOGLE_API_KEY")
-    if not api_key:
-        raise ValueError(
-            "GOOGLE_API_KEY environment variable is not set. "
-            "Get your API key from https://aistudio.google.com/app/apikey"
-        )
+    batch_info = _parse_structured_input(raw_text)
+    if batch_info is not None:
+        print("[STAGE I] Input is already structured claims JSON, skipping LLM extraction")
+    else:
+        # Generate content using Gemini 2.5 Flash
+        batch_info = _generate_validated(_get_client(), _build_extraction_prompt(raw_text), BatchFNOLInfo)
+    
+    # Feedback loop: If enabled, ask LLM to review and improve the extraction
+    if enable_feedback_loop:
+        print("\n[FEEDBACK LOOP] Initiating LLM self-review...")
+        batch_info = _apply_feedback_loop(_get_client(), raw_text, batch_info)
     
-    # Initialize the client with the API key from environment
-    client = genai.Client(api_key=api_key)
-    
-    # Craft the extraction prompt for batch processing
-    prompt = f"""You are an insurance claims processing assistant. Extract structured information from the following text that contains multiple First Notice of Loss (FNOL) claims.
-
-For EACH claim found in the text, extract the following information:
-
-1. claim_id: Unique claim identifier (if mentioned)
-2. incident_date: Date and time of incident
-3. incident_location: Location where incident occurred (MUST be a physical/geographic location, not event descriptions like "in a hailstorm")
-4. policyholder_name: Name of the policyholder/customer
-5. contact_phone: Contact phone number
-6. contact_email: Contact email address
-7. vehicle: Object containing:
-   - make: Vehicle manufacturer
-   - model: Vehicle model
-   - year: Vehicle year
-   - vin: Vehicle Identification Number
-   - license_plate: License plate number
-   - color: Vehicle color
-8. damage: Object containing:
-   - description: Detailed description of ONLY the physical damage observed (do NOT include cause or context)
-   - location: Specific location on vehicle where damage occurred (e.g., "windshield", "rear bumper", "driver side doors")
-   - severity: Severity (minor, moderate, severe) - infer based on damage extent
-   - estimated_repair_cost: Estimated cost (numeric value only)
-9. incident_description: Full description of how the incident occurred (can copy from original text)
-10. other_parties_involved: Boolean - were other parties involved? (infer from context if not explicit)
-11. police_report_filed: Boolean - was a police report filed? (infer from context if not explicit)
-
-CRITICAL EXTRACTION RULES:
-- Extract ALL available information from the text
-- For damage.description: Focus ONLY on physical damage, not cause (e.g., "dented rear bumper and broken taillight" NOT "someone hit my car and dented...")
-- For incident_location: Only use geographic/physical locations (e.g., "highway", "grocery store", "intersection"), set to null if only event description available
-- For damage.location: Be specific about vehicle parts affected
-- Infer boolean fields (other_parties_involved, police_report_filed) from context when possible
-- Use null ONLY for information that is truly not present or inferable
-- Ensure ALL JSON is perfectly valid - no extra fields, no typos, no random text
-
-QUALITY CHECKLIST (aim for 10/10):
-✓ All explicit information extracted
-✓ damage.description focuses on physical damage only
-✓ incident_location is a physical place or null
-✓ damage.location is specific
-✓ Boolean fields inferred when possible
-✓ JSON is perfectly valid and parseable
-✓ No missing extractable information
-
-FNOL Text:
-{raw_text}
-
-Return ONLY a valid JSON object in this exact format:
-{{
-  "claims": [
-    {{ ... claim 1 data ... }},
-    {{ ... claim 2 data ... }},
-    ...
-  ]
-}}
-
-CRITICAL: Return ONLY the JSON object, no explanations, no markdown formatting, no extra text. The JSON must be perfectly parseable."""
+    return batch_info
 
-    # Generate content using Gemini 2.5 Flash
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=prompt
-    )
+
+async def extract_fnol_information_batch_async(raw_text: str, enable_feedback_loop: bool = False) -> BatchFNOLInfo:
+    """Async variant of extract_fnol_information_batch using the shared client.
+    
+    Args:
+        raw_text: Raw text containing one or more FNOL claims
+        enable_feedback_loop: If True, enables LLM self-review and refinement (default: False)
+        
+    Returns:
+        BatchFNOLInfo object with list of extracted claims
+    """
+    batch_info = _parse_structured_input(raw_text)
+    if batch_info is not None:
+        print("[STAGE I] Input is already structured claims JSON, skipping LLM extraction")
+    else:
+        batch_info = await _generate_validated_async(_get_client(), _build_extraction_prompt(raw_text), BatchFNOLInfo)
+    
+    if enable_feedback_loop:
+        print("\n[FEEDBACK LOOP] Initiating LLM self-review...")
+        batch_info = await _apply_feedback_loop_async(_get_client(), raw_text, batch_info)
+    
+    return batch_info
+
+
+def _parse_structured_input(raw_text: str) -> Optional[BatchFNOLInfo]:
+    """Return the input as a BatchFNOLInfo if it is already extracted claims JSON.
     
-    # Parse the response and create BatchFNOLInfo object
+    Pipelines that extract upstream pass {"claims": [...]} documents, which
+    need no LLM call. Anything else, including JSON of another shape or with
+    no claims, returns None and goes through normal extraction.
+    """
+    stripped = raw_text.strip()
+    if not (stripped.startswith("{") and stripped.endswith("}")):
+        return None
     try:
-        # Clean the response text (remove markdown code blocks if present)
-        response_text = response.text.strip()
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        if response_text.startswith("```"):
-            response_text = response_text[3:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-        response_text = response_text.strip()
-        
-        # Try to extract just the JSON object by finding the outermost braces
-        first_brace = response_text.find('{')
-        last_brace = response_text.rfind('}')
-        if first_brace != -1 and last_brace != -1 and last_brace > first_brace:
-            response_text = response_text[first_brace:last_brace+1]
-        
-        # Parse JSON
-        extracted_data = json.loads(response_text)
-        
-        # Create BatchFNOLInfo object from extracted data
-        batch_info = BatchFNOLInfo(**extracted_data)
-        
-        # Feedback loop: If enabled, ask LLM to review and improve the extraction
-        if enable_feedback_loop:
-            print("\n[FEEDBACK LOOP] Initiating LLM self-review...")
-            batch_info = _apply_feedback_loop(client, raw_text, batch_info)
+        batch_info = BatchFNOLInfo.model_validate_json(stripped)
+    except ValidationError:
+        return None
+    return batch_info if batch_info.claims else None
+
+
+async def stream_fnol_information_async(raw_text: str) -> AsyncIterator[FNOLInfo]:
+    """Stream Stage I claims as soon as each one has been generated.
+    
+    Uses Gemini's streaming API and an incremental JSON parser, so the first
+    claim is available after roughly the time-to-first-token instead of after
+    the whole batch has been generated. Unlike the batch extraction, a claim
+    that fails validation is not retried, because earlier claims have already
+    been handed to the caller.
+    
+    Args:
+        raw_text: Raw text containing one or more FNOL claims
         
-        return batch_info
+    Yields:
+        FNOLInfo objects in the order the model produces them
         
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Failed to parse LLM response as JSON: {e}\nResponse: {response.text}")
-    except Exception as e:
-        raise ValueError(f"Failed to create BatchFNOLInfo object: {e}")
+    Raises:
+        ValueError: If GOOGLE_API_KEY is not set or a claim does not match the schema
+    """
+    client = _get_client()
+    prompt = _build_extraction_prompt(raw_text)
+    parser = JSONArrayItemParser()
+    
+    cache_key = _contents_cache_key(prompt.system_instruction, prompt.contents)
+    cached = llm_cache.get(cache_key, MODEL_NAME)
+    if cached is not None:
+        for item in parser.feed(cached):
+            yield _parse_streamed_claim(item)
+        return
+    
+    chunks: list[str] = []
+    cache_name = await context_cache.get_cache_name_async(client, MODEL_NAME, prompt.system_instruction)
+    request_config = _request_config(_json_config(BatchFNOLInfo), prompt.system_instruction, cache_name)
+    stream = await client.aio.models.generate_content_stream(
+        model=MODEL_NAME,
+        contents=prompt.contents,
+        config=request_config
+    )
+    async for chunk in stream:
+        if not chunk.text:
+            continue
+        chunks.append(chunk.text)
+        for item in parser.feed(chunk.text):
+            yield _parse_streamed_claim(item)
+    
+    # Joined once at the end; growing a string per chunk would be quadratic
+    response_text = "".join(chunks)
+    if not looks_complete(response_text):
+        raise ValueError(f"Stage I stream ended before the JSON document was complete\nResponse: {response_text}")
+    llm_cache.set(cache_key, MODEL_NAME, response_text)
+
+
+def _parse_streamed_claim(item_text: str) -> FNOLInfo:
+    """Validate one streamed claim object."""
+    try:
+        return _parse_response(FNOLInfo, item_text)
+    except (ValidationError, orjson.JSONDecodeError) as e:
+        raise ValueError(f"Failed to create FNOLInfo object: {e}\nResponse: {item_text}")
+
+
+def _build_extraction_prompt(raw_text: str) -> _Prompt:
+    """Build the Stage I extraction prompt for the given raw FNOL text."""
+    return _Prompt(_STAGE_I_SYSTEM_PROMPT, raw_text)
+
+
+# Deterministic versions of the extraction rules the feedback reviewer enforces.
+# The event pattern must match the whole incident_location ("in a hailstorm",
+# "accident"), so place names such as "Storm Lake, IA" pass.
+_EVENT_LOCATION_RE = re.compile(
+    r"^\s*(?:(?:in|during|at)\s+)?(?:(?:a|an|the)\s+)?(?:hail\s*storm|storm|accident)\s*$", re.IGNORECASE
+)
+_DAMAGE_CAUSE_RE = re.compile(r"^\s*(someone|somebody|another (car|driver|vehicle)|i was|while|when)\b", re.IGNORECASE)
+
+
+def _local_quality_check(batch_fnol_info: BatchFNOLInfo) -> list[ReviewIssue]:
+    """Check an extraction against the rules that can be verified without an LLM.
+    
+    Args:
+        batch_fnol_info: Extraction to check
+        
+    Returns:
+        List of issues found; empty if every rule passes
+    """
+    issues = []
+    for idx, claim in enumerate(batch_fnol_info.claims):
+        claim_id = claim.claim_id or f"CLAIM-{idx+1}"
+        _, missing_fields = claim.validate_required_fields()
+        for field in missing_fields:
+            issues.append(ReviewIssue(
+                claim_id=claim_id, field=field, issue="Required field is missing",
+                suggestion="Extract it from the text if it is present"
+            ))
+        for field in claim.malformed_fields():
+            issues.append(ReviewIssue(
+                claim_id=claim_id, field=field, issue="Value does not match the expected format",
+                suggestion="Copy the value exactly as written in the text, or use null"
+            ))
+        if claim.incident_location and _EVENT_LOCATION_RE.match(claim.incident_location):
+            issues.append(ReviewIssue(
+                claim_id=claim_id, field="incident_location", issue="Describes an event, not a place",
+                suggestion="Use a physical/geographic location or null"
+            ))
+        if claim.damage and _DAMAGE_CAUSE_RE.search(claim.damage.description):
+            issues.append(ReviewIssue(
+                claim_id=claim_id, field="damage.description", issue="Describes the cause, not the damage",
+                suggestion="Describe only the physical damage observed"
+            ))
+    return issues
+
+
+def _extraction_json(extraction: BatchFNOLInfo) -> str:
+    """Serialize an extraction for the review and refinement prompts, omitting null fields."""
+    return extraction.model_dump_json(exclude_none=True)
+
+
+def _build_review_prompt(original_text: str, extraction_json: str) -> _Prompt:
+    """Build the feedback loop prompt asking the LLM to review an extraction.
+    
+    Args:
+        original_text: The original raw FNOL text
+        extraction_json: The extraction to review, from _extraction_json
+    """
+    return _Prompt(
+        _REVIEW_SYSTEM_PROMPT,
+        "Original FNOL Text:\n" + original_text
+        + "\n\nExtracted Data (JSON, null fields omitted):\n" + extraction_json
+    )
+
+
+def _build_refinement_prompt(
+    original_text: str,
+    extraction_json: str,
+    review: Optional[ExtractionReview],
+    local_issues: list[ReviewIssue]
+) -> _Prompt:
+    """Build the feedback loop prompt asking the LLM to refine an extraction.
+    
+    Args:
+        original_text: The original raw FNOL text
+        extraction_json: The extraction to refine, from _extraction_json
+        review: Reviewer feedback, or None when refining on the local checks alone
+        local_issues: Issues found by _local_quality_check
+    """
+    review_section = "\n\nFeedback Received:\n" + review.model_dump_json(exclude_none=True) if review else ""
+    return _Prompt(
+        _REFINEMENT_SYSTEM_PROMPT,
+        "Original FNOL Text:\n" + original_text
+        + "\n\nCurrent Extraction (null fields omitted):\n" + extraction_json
+        + review_section
+        + "\n\nRule violations found by automatic checks:\n"
+        + orjson.dumps([issue.model_dump(exclude_none=True) for issue in local_issues]).decode()
+    )
+
+
+def _print_review(review: ExtractionReview) -> None:
+    """Print the reviewer's score, verdict and first few issues."""
+    print(f"[FEEDBACK] Quality Score: {review.overall_quality_score}/10")
+    print(f"[FEEDBACK] JSON Valid: {review.json_valid}")
+    print(f"[FEEDBACK] {review.feedback or 'No feedback provided'}")
+    
+    if review.issues:
+        print(f"[FEEDBACK] Found {len(review.issues)} issues to address")
+        for idx, issue in enumerate(review.issues[:3], 1):  # Show first 3 issues
+            print(f"  {idx}. {issue.field or 'unknown'}: {issue.issue or 'no details'}")
 
 
 def _apply_feedback_loop(client: genai.Client, original_text: str, initial_extraction: BatchFNOLInfo, max_iterations: int = 5) -> BatchFNOLInfo:
@@ -150,6 +698,7 @@ def _apply_feedback_loop(client: genai.Client, original_text: str, initial_extra
     This function sends the initial extraction back to the LLM for review,
     receives feedback on what's missing or incorrect, and then refines the extraction.
     It will iterate until achieving a quality score of 10/10 or reaching max iterations.
+    Extractions that pass the local rule checks are returned without any LLM calls.
     
     Args:
         client: Initialized Gemini client
@@ -164,97 +713,34 @@ def _apply_feedback_loop(client: genai.Client, original_text: str, initial_extra
     iteration = 0
     target_score = 10
     
+    # Only pay for the review/refine round-trips when a deterministic rule fires
+    local_issues = _local_quality_check(current_extraction)
+    if not local_issues:
+        print("[FEEDBACK] ✓ Local quality checks passed, skipping LLM review")
+        return current_extraction
+    
     while iteration < max_iterations:
         iteration += 1
         print(f"\n[FEEDBACK LOOP - Iteration {iteration}/{max_iterations}]")
+        # Serialized once per iteration and shared by the review and refinement prompts
+        extraction_json = _extraction_json(current_extraction)
         
-        # Step 1: Ask LLM to review the extraction and provide feedback
-        feedback_prompt = f"""You are a quality assurance reviewer for insurance claims extraction.
-
-Original FNOL Text:
-{original_text}
-
-Extracted Data (JSON):
-{current_extraction.model_dump_json(indent=2)}
-
-Review the extracted data against the original text and provide feedback on:
-1. Missing information that should have been extracted
-2. Incorrect or inaccurate extractions
-3. Fields that could be more complete or detailed
-4. Any inconsistencies between the original text and extracted data
-5. JSON structure and parseability issues
-
-Return a JSON object with:
-{{
-  "feedback": "Overall assessment of the extraction quality",
-  "issues": [
-    {{
-      "claim_id": "ID of claim with issue",
-      "field": "name of field with issue",
-      "issue": "description of the problem",
-      "suggestion": "suggested correction or addition"
-    }}
-  ],
-  "json_valid": true/false,
-  "overall_quality_score": 1-10
-}}
-
-SCORING CRITERIA:
-- 10/10: Perfect extraction - all available info extracted, JSON valid, no issues, follows all rules
-- 9/10: Excellent but minor improvement possible (e.g., slight wording preference)
-- 8/10: Very good but 1-2 small issues
-- 7/10 or below: Missing data or rule violations
-
-Be pragmatic: If the text doesn't provide information (like incident_date), that's acceptable.
-Only deduct points for information that WAS available but not extracted, or rule violations.
-
-Do not include markdown formatting, just raw JSON."""
-
-        feedback_response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=feedback_prompt
-        )
-        
-        # Parse feedback
-        feedback_text = feedback_response.text.strip()
-        if feedback_text.startswith("```json"):
-            feedback_text = feedback_text[7:]
-        if feedback_text.startswith("```"):
-            feedback_text = feedback_text[3:]
-        if feedback_text.endswith("```"):
-            feedback_text = feedback_text[:-3]
-        feedback_text = feedback_text.strip()
-        
-        # Try to extract JSON by finding outermost braces
-        first_brace = feedback_text.find('{')
-        last_brace = feedback_text.rfind('}')
-        if first_brace != -1 and last_brace != -1 and last_brace > first_brace:
-            feedback_text = feedback_text[first_brace:last_brace+1]
-        
+        # Step 1: Ask LLM to review the extraction and provide feedback.
+        # Review output is constrained to, and validated against, the review schema
         try:
-            feedback_data = json.loads(feedback_text)
-            quality_score = feedback_data.get('overall_quality_score', 0)
-            json_valid = feedback_data.get('json_valid', True)
-            
-            print(f"[FEEDBACK] Quality Score: {quality_score}/10")
-            print(f"[FEEDBACK] JSON Valid: {json_valid}")
-            print(f"[FEEDBACK] {feedback_data.get('feedback', 'No feedback provided')}")
-            
-            if feedback_data.get('issues'):
-                print(f"[FEEDBACK] Found {len(feedback_data['issues'])} issues to address")
-                for idx, issue in enumerate(feedback_data['issues'][:3], 1):  # Show first 3 issues
-                    print(f"  {idx}. {issue.get('field', 'unknown')}: {issue.get('issue', 'no details')}")
+            review = _generate_validated(client, _build_review_prompt(original_text, extraction_json), ExtractionReview)
+            _print_review(review)
+            quality_score = review.overall_quality_score
             
             # Check if we've achieved target score
-            if quality_score >= target_score and json_valid:
+            if quality_score >= target_score and review.json_valid:
                 print(f"[FEEDBACK] ✓ Target score of {target_score}/10 achieved!")
                 return current_extraction
                 
-        except json.JSONDecodeError:
+        except ValueError:
             print("[FEEDBACK] Warning: Could not parse feedback JSON, proceeding with refinement")
-            feedback_data = {"feedback": "Unable to parse feedback", "issues": [], "json_valid": False, "overall_quality_score": 0}
+            review = ExtractionReview(feedback="Unable to parse feedback", json_valid=False)
             quality_score = 0
-            json_valid = False
         
         # If we've reached max iterations but haven't achieved target, return best effort
         if iteration >= max_iterations:
@@ -263,69 +749,19 @@ Do not include markdown formatting, just raw JSON."""
         
         # Step 2: Ask LLM to refine the extraction based on feedback
         print(f"[FEEDBACK] Refining extraction (attempt {iteration + 1})...")
-        refinement_prompt = f"""You are an insurance claims processor refining an extraction based on feedback.
-
-Original FNOL Text:
-{original_text}
-
-Current Extraction:
-{current_extraction.model_dump_json(indent=2)}
-
-Feedback Received:
-{json.dumps(feedback_data, indent=2)}
-
-CRITICAL: You must return ONLY valid, parseable JSON. No extra text, no markdown, no comments.
-
-Based on the feedback, create an improved extraction addressing ALL issues identified.
-Return ONLY a valid JSON object with this exact structure:
-{{
-  "claims": [
-    {{ ... improved claim 1 data ... }},
-    {{ ... improved claim 2 data ... }},
-    ...
-  ]
-}}
-
-Ensure:
-1. All JSON is valid and parseable
-2. No extra text or markdown formatting
-3. All issues from feedback are addressed
-4. No random text or fields are added
-
-RETURN ONLY THE JSON OBJECT, NOTHING ELSE."""
-
-        refinement_response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=refinement_prompt
-        )
+        refinement_prompt = _build_refinement_prompt(original_text, extraction_json, review, local_issues)
         
-        # Parse refined extraction
-        refined_text = refinement_response.text.strip()
-        if refined_text.startswith("```json"):
-            refined_text = refined_text[7:]
-        if refined_text.startswith("```"):
-            refined_text = refined_text[3:]
-        if refined_text.endswith("```"):
-            refined_text = refined_text[:-3]
-        refined_text = refined_text.strip()
-        
-        # Try to extract JSON by finding outermost braces
-        first_brace = refined_text.find('{')
-        last_brace = refined_text.rfind('}')
-        if first_brace != -1 and last_brace != -1 and last_brace > first_brace:
-            refined_text = refined_text[first_brace:last_brace+1]
-        
-        # Validate JSON parseability
+        # Refinement output is constrained to, and validated against, the Stage I schema
         try:
-            refined_data = json.loads(refined_text)
-            refined_batch_info = BatchFNOLInfo(**refined_data)
-            print(f"[FEEDBACK] ✓ Refinement successful, JSON valid")
+            refined_batch_info = _generate_validated(client, refinement_prompt, BatchFNOLInfo)
+            print("[FEEDBACK] ✓ Refinement successful, JSON valid")
             # Update current extraction for next iteration
             current_extraction = refined_batch_info
+            local_issues = _local_quality_check(current_extraction)
             
-        except (json.JSONDecodeError, Exception) as e:
+        except ValueError as e:
             print(f"[FEEDBACK] ✗ Refinement failed: {e}")
-            print(f"[FEEDBACK] Keeping previous extraction and trying again...")
+            print("[FEEDBACK] Keeping previous extraction and trying again...")
             # Keep current_extraction unchanged and continue loop
     
     # If we exit the loop without returning, return the last valid extraction
@@ -333,6 +769,82 @@ RETURN ONLY THE JSON OBJECT, NOTHING ELSE."""
     return current_extraction
 
 
+async def _apply_feedback_loop_async(
+    client: genai.Client,
+    original_text: str,
+    initial_extraction: BatchFNOLInfo,
+    max_iterations: int = 5
+) -> BatchFNOLInfo:
+    """Async variant of _apply_feedback_loop with speculative refinement.
+    
+    Each iteration starts the refinement at the same time as the review,
+    driven by the local rule violations only, so an iteration costs one
+    round-trip instead of two. If the review reaches the target score the
+    speculative refinement is cancelled and discarded.
+    
+    Args:
+        client: Initialized Gemini client
+        original_text: The original raw FNOL text
+        initial_extraction: The initial BatchFNOLInfo extraction
+        max_iterations: Maximum number of refinement iterations (default: 5)
+        
+    Returns:
+        Refined BatchFNOLInfo object after feedback
+    """
+    current_extraction = initial_extraction
+    target_score = 10
+    
+    local_issues = _local_quality_check(current_extraction)
+    if not local_issues:
+        print("[FEEDBACK] ✓ Local quality checks passed, skipping LLM review")
+        return current_extraction
+    
+    for iteration in range(1, max_iterations + 1):
+        print(f"\n[FEEDBACK LOOP - Iteration {iteration}/{max_iterations}]")
+        extraction_json = _extraction_json(current_extraction)
+        
+        review_task = asyncio.create_task(_generate_validated_async(
+            client, _build_review_prompt(original_text, extraction_json), ExtractionReview
+        ))
+        refine_task = None
+        if iteration < max_iterations:
+            refine_task = asyncio.create_task(_generate_validated_async(
+                client, _build_refinement_prompt(original_text, extraction_json, None, local_issues), BatchFNOLInfo
+            ))
+        
+        try:
+            try:
+                review = await review_task
+                _print_review(review)
+                quality_score = review.overall_quality_score
+                if quality_score >= target_score and review.json_valid:
+                    print(f"[FEEDBACK] ✓ Target score of {target_score}/10 achieved!")
+                    return current_extraction
+            except ValueError:
+                print("[FEEDBACK] Warning: Could not parse feedback JSON, proceeding with refinement")
+                quality_score = 0
+            
+            if refine_task is None:
+                print(f"[FEEDBACK] Max iterations ({max_iterations}) reached. Final score: {quality_score}/10")
+                return current_extraction
+            
+            print(f"[FEEDBACK] Refining extraction (attempt {iteration + 1})...")
+            try:
+                current_extraction = await refine_task
+                print("[FEEDBACK] ✓ Refinement successful, JSON valid")
+                local_issues = _local_quality_check(current_extraction)
+            except ValueError as e:
+                print(f"[FEEDBACK] ✗ Refinement failed: {e}")
+                print("[FEEDBACK] Keeping previous extraction and trying again...")
+        finally:
+            # No-op once the refinement has finished; discards it otherwise
+            if refine_task is not None:
+                refine_task.cancel()
+    
+    print(f"[FEEDBACK] Returning best extraction after {max_iterations} iterations")
+    return current_extraction
+
+
 def assess_claim_severity(batch_fnol_info: BatchFNOLInfo) -> BatchSeverityAssessment:
     """Assess severity and estimate costs for extracted FNOL claims.
     
@@ -350,101 +862,169 @@ def assess_claim_severity(batch_fnol_info: BatchFNOLInfo) -> BatchSeverityAssess
         ValueError: If GOOGLE_API_KEY environment variable is not set
         Exception: If the API request fails
     """
-    api_key = os.environ.get("GOOGLE_API_KEY")
-    if not api_key:
-        raise ValueError(
-            "GOOGLE_API_KEY environment variable is not set. "
-            "Get your API key from https://aistudio.google.com/app/apikey"
-        )
+    client = _get_client()
+    unique_batch, positions = _dedupe_claims(batch_fnol_info)
     
-    # Initialize the client
-    client = genai.Client(api_key=api_key)
+    # Generate content using Gemini 2.5 Flash
+    result = _generate_validated(client, _build_severity_prompt(unique_batch), BatchSeverityAssessment)
+    if unique_batch is batch_fnol_info:
+        return result
+    expanded = _expand_assessments(result, batch_fnol_info, unique_batch, positions)
+    if expanded is None:
+        print("[STAGE II] Assessments did not cover every deduplicated claim, reassessing all claims")
+        expanded = _generate_validated(client, _build_severity_prompt(batch_fnol_info), BatchSeverityAssessment)
+    return expanded
+
+
+async def assess_claim_severity_async(batch_fnol_info: BatchFNOLInfo) -> BatchSeverityAssessment:
+    """Async variant of assess_claim_severity using the shared client.
     
-    # Prepare claim summaries for assessment
-    claims_summary = []
+    Args:
+        batch_fnol_info: BatchFNOLInfo object with extracted claims from Stage I
+        
+    Returns:
+        BatchSeverityAssessment with severity classifications and cost estimates
+    """
+    client = _get_client()
+    unique_batch, positions = _dedupe_claims(batch_fnol_info)
+    result = await _generate_validated_async(client, _build_severity_prompt(unique_batch), BatchSeverityAssessment)
+    if unique_batch is batch_fnol_info:
+        return result
+    expanded = _expand_assessments(result, batch_fnol_info, unique_batch, positions)
+    if expanded is None:
+        print("[STAGE II] Assessments did not cover every deduplicated claim, reassessing all claims")
+        expanded = await _generate_validated_async(client, _build_severity_prompt(batch_fnol_info), BatchSeverityAssessment)
+    return expanded
+
+
+def _dedupe_claims(batch_fnol_info: BatchFNOLInfo) -> tuple[BatchFNOLInfo, list[int]]:
+    """Collapse claims with identical damage and incident text before Stage II.
+    
+    Duplicate reports (e.g. repeated rows in an export) get identical
+    answers, so only the first claim of each group is sent to the model.
+    
+    Args:
+        batch_fnol_info: BatchFNOLInfo object with extracted claims from Stage I
+        
+    Returns:
+        Tuple of (batch of unique claims with their IDs pinned, position in
+        that batch of each original claim)
+    """
+    unique: dict[tuple, int] = {}
+    unique_claims = []
+    positions = []
     for idx, claim in enumerate(batch_fnol_info.claims):
-        loss_desc = claim.damage.description if claim.damage else "No damage description provided"
-        damage_area = claim.damage.location if claim.damage and claim.damage.location else "Unknown"
-        
-        claim_summary = {
-            "claim_id": claim.claim_id or f"CLAIM-{idx+1}",
-            "loss_desc": loss_desc,
-            "damage_area": damage_area,
-            "incident_description": claim.incident_description or "No incident description"
-        }
-        claims_summary.append(claim_summary)
-    
-    # Craft the Stage II prompt
-    prompt = f"""You are an insurance claims severity assessment specialist. Based on the claim information provided, classify the damage severity and estimate repair costs.
-
-For each claim, analyze the loss_desc (damage description) and damage_area to classify the damage as 'Minor', 'Moderate', or 'Major'. Also provide an estimated repair cost (estimated_cost) as a float.
-
-Use the following guidelines:
-- Minor: $100-$1,000 - Small cosmetic damage, minor scratches, small chips
-- Moderate: $1,000-$5,000 - Significant body damage, broken parts, multiple areas affected
-- Major: $5,000-$50,000 - Severe structural damage, airbag deployment, vehicle not drivable, extensive damage
-
-Claims to assess:
-{json.dumps(claims_summary, indent=2)}
-
-Return a JSON object with an "assessments" array containing one assessment per claim:
-{{
-  "assessments": [
-    {{
-      "claim_id": "claim identifier",
-      "severity": "Minor|Moderate|Major",
-      "estimated_cost": float_value,
-      "reasoning": "Brief explanation of severity classification"
-    }},
-    ...
-  ]
-}}
-
-Do not include any explanation or markdown formatting, just the raw JSON."""
+        key = _claim_content_key(idx, claim)
+        if key not in unique:
+            unique[key] = len(unique_claims)
+            unique_claims.append(claim if claim.claim_id else claim.model_copy(update={"claim_id": f"CLAIM-{idx+1}"}))
+        positions.append(unique[key])
+    
+    if len(unique_claims) == len(batch_fnol_info.claims):
+        return batch_fnol_info, positions
+    return BatchFNOLInfo.model_construct(claims=unique_claims), positions
 
-    # Generate content using Gemini 2.5 Flash
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=prompt
+
+def _expand_assessments(
+    result: BatchSeverityAssessment,
+    batch_fnol_info: BatchFNOLInfo,
+    unique_batch: BatchFNOLInfo,
+    positions: list[int]
+) -> Optional[BatchSeverityAssessment]:
+    """Fan the assessments of unique claims back out to every original claim.
+    
+    Assessments are joined on the claim IDs pinned by _dedupe_claims, so the
+    order in which the model returns them does not matter.
+    
+    Args:
+        result: Assessments returned for the deduplicated batch
+        batch_fnol_info: The original, undeduplicated batch
+        unique_batch: The deduplicated batch sent to the model
+        positions: Position of each original claim in the deduplicated batch
+        
+    Returns:
+        BatchSeverityAssessment with one assessment per original claim, or
+        None if the model left out any of the pinned claim IDs
+    """
+    unique_assessments = [result.by_id.get(claim.claim_id) for claim in unique_batch.claims]
+    if None in unique_assessments:
+        return None
+    
+    assessments = [
+        unique_assessments[position].model_copy(update={"claim_id": claim.claim_id or f"CLAIM-{idx+1}"})
+        for idx, (claim, position) in enumerate(zip(batch_fnol_info.claims, positions))
+    ]
+    return BatchSeverityAssessment.model_construct(assessments=assessments)
+
+
+def _project_claim(idx: int, claim: FNOLInfo) -> tuple[str, Optional[str], Optional[str], str]:
+    """Read only the fields Stages II and III need from a claim.
+    
+    Args:
+        idx: Position of the claim in its batch, used for the fallback ID
+        claim: Extracted claim
+        
+    Returns:
+        Tuple of (claim_id, damage description, damage location, incident description)
+    """
+    damage = claim.damage
+    return (
+        claim.claim_id or f"CLAIM-{idx+1}",
+        damage.description if damage else None,
+        damage.location if damage else None,
+        claim.incident_description or "No incident description"
     )
+
+
+def _claim_content_key(idx: int, claim: FNOLInfo) -> tuple:
+    """Key under which claims with identical Stage II input are deduplicated."""
+    _, damage_desc, damage_location, incident_desc = _project_claim(idx, claim)
+    return damage_desc, damage_location, incident_desc
+
+
+def _severity_payload(idx: int, claim: FNOLInfo) -> dict:
+    """Build the Stage II data sent to the model for one claim."""
+    claim_id, damage_desc, damage_location, incident_desc = _project_claim(idx, claim)
+    return {
+        "claim_id": claim_id,
+        "loss_desc": damage_desc if damage_desc is not None else "No damage description provided",
+        "damage_area": damage_location or "Unknown",
+        "incident_description": incident_desc
+    }
+
+
+def _build_severity_prompt(batch_fnol_info: BatchFNOLInfo) -> _Prompt:
+    """Build the Stage II severity assessment prompt for the given claims."""
+    # Encode claim by claim so each payload dict is freed as soon as it is written
+    items = b",".join(orjson.dumps(_severity_payload(idx, claim)) for idx, claim in enumerate(batch_fnol_info.claims))
+    return _Prompt(_STAGE_II_SYSTEM_PROMPT, "[" + items.decode() + "]")
+
+
+def _build_claim_severity_prompt(idx: int, claim: FNOLInfo) -> _Prompt:
+    """Build the Stage II prompt that assesses a single claim."""
+    return _Prompt(_STAGE_II_CLAIM_SYSTEM_PROMPT, orjson.dumps(_severity_payload(idx, claim)).decode())
+
+
+async def assess_one_claim_async(claim: FNOLInfo, idx: int = 0) -> SeverityAssessment:
+    """Assess the severity of a single claim with its own Gemini call.
     
-    # Parse the response
-    try:
-        # Clean the response text
-        response_text = response.text.strip()
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        if response_text.startswith("```"):
-            response_text = response_text[3:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-        response_text = response_text.strip()
-        
-        # Try to extract just the JSON object by finding the outermost braces
-        first_brace = response_text.find('{')
-        last_brace = response_text.rfind('}')
-        if first_brace != -1 and last_brace != -1 and last_brace > first_brace:
-            response_text = response_text[first_brace:last_brace+1]
-        
-        # Parse JSON
-        assessment_data = json.loads(response_text)
-        
-        # Create BatchSeverityAssessment object
-        batch_assessment = BatchSeverityAssessment(**assessment_data)
-        return batch_assessment
-        
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Failed to parse Stage II LLM response as JSON: {e}\nResponse: {response.text}")
-    except Exception as e:
-        raise ValueError(f"Failed to create BatchSeverityAssessment object: {e}")
+    Args:
+        claim: Extracted claim from Stage I
+        idx: Position of the claim in its batch, used for the fallback ID
+        
+    Returns:
+        SeverityAssessment for the claim
+    """
+    client = _get_client()
+    return await _generate_validated_async(client, _build_claim_severity_prompt(idx, claim), SeverityAssessment)
 
 
 def route_claims_to_queues(batch_fnol_info: BatchFNOLInfo, batch_severity: BatchSeverityAssessment) -> BatchQueueRouting:
     """Route claims to appropriate queues with priority assignment.
     
     Stage III: Queue Routing and Priority Assignment
-    This function takes outputs from Stage I and Stage II and uses an LLM to
-    assign each claim to the appropriate processing queue with priority.
+    The routing rules are a fixed mapping from severity and damage location,
+    so this stage runs locally instead of costing another Gemini round-trip.
     
     Args:
         batch_fnol_info: BatchFNOLInfo object with extracted claims from Stage I
@@ -452,115 +1032,576 @@ def route_claims_to_queues(batch_fnol_info: BatchFNOLInfo, batch_severity: Batch
         
     Returns:
         BatchQueueRouting with queue assignments and priorities
+    """
+    assessments = batch_severity.assessments
+    routings = []
+    for idx, claim in enumerate(batch_fnol_info.claims):
+        # Assessments normally come back in claim order; join by ID only when
+        # the one at this position belongs to another claim or is missing
+        claim_id = claim.claim_id or f"CLAIM-{idx+1}"
+        assessment = assessments[idx] if idx < len(assessments) else None
+        if assessment is None or assessment.claim_id not in (None, claim_id):
+            assessment = batch_severity.by_id.get(claim_id, assessment)
+        if assessment is not None:
+            routings.append(route_claim(claim, assessment, idx))
+    return BatchQueueRouting.model_construct(routings=routings)
+
+
+def route_claim(claim: FNOLInfo, assessment: SeverityAssessment, idx: int = 0) -> QueueRouting:
+    """Route a single claim from its severity and damage location.
+    
+    Minor glass-only damage goes to 'glass', other Minor damage to
+    'fast_track', Moderate to 'material_damage' and Major to 'total_loss'.
+    Unrecognised severities are treated as Moderate.
+    
+    Args:
+        claim: Extracted claim from Stage I
+        assessment: Severity assessment of the claim from Stage II
+        idx: Position of the claim in its batch, used for the fallback ID
+        
+    Returns:
+        QueueRouting for the claim
+    """
+    claim_id, damage_desc, damage_location, _ = _project_claim(idx, claim)
+    severity = assessment.severity.capitalize()
+    if severity not in _SEVERITY_QUEUES:
+        severity = "Moderate"
+    
+    queue = _SEVERITY_QUEUES[severity]
+    if severity == "Minor" and _is_glass_damage(damage_location or damage_desc):
+        queue = "glass"
+    
+    # Every value comes from the routing tables above, so skip validation
+    return QueueRouting.model_construct(
+        claim_id=claim_id,
+        queue=queue,
+        priority=_SEVERITY_PRIORITIES[severity],
+        reasoning=f"{severity} damage routed to {queue}"
+    )
+
+
+def _is_glass_damage(text: Optional[str]) -> bool:
+    """Return True if a damage location or description refers to glazing only."""
+    if not text:
+        return False
+    text = text.lower()
+    return bool(_GLASS_TERMS_RE.search(text)) and not _NON_GLASS_TERMS_RE.search(text)
+
+
+async def extract_assess_and_route_async(raw_text: str) -> PipelineResult:
+    """Run Stages I and II in a single structured-output Gemini call, then route locally.
+    
+    The per-stage pipeline pays sequential round-trips and re-sends the
+    extracted claims in the Stage II prompt. This variant asks the model for
+    the claims and their assessments at once, constrained to the
+    ExtractionAssessment schema. Stage III is the same deterministic routing
+    as in the per-stage pipeline, so both modes route a claim identically.
+    
+    Args:
+        raw_text: Raw text containing one or more FNOL claims
+        
+    Returns:
+        PipelineResult with claims, assessments and routings in claim order
         
     Raises:
-        ValueError: If GOOGLE_API_KEY environment variable is not set
-        Exception: If the API request fails
+        ValueError: If GOOGLE_API_KEY is not set or the response does not match the schema
     """
-    api_key = os.environ.get("GOOGLE_API_KEY")
-    if not api_key:
-        raise ValueError(
-            "GOOGLE_API_KEY environment variable is not set. "
-            "Get your API key from https://aistudio.google.com/app/apikey"
-        )
+    client = _get_client()
+    combined = await _generate_validated_async(client, _build_combined_prompt(raw_text), ExtractionAssessment)
+    routing = route_claims_to_queues(
+        BatchFNOLInfo.model_construct(claims=combined.claims),
+        BatchSeverityAssessment.model_construct(assessments=combined.assessments)
+    )
+    return PipelineResult.model_construct(
+        claims=combined.claims,
+        assessments=combined.assessments,
+        routings=routing.routings
+    )
+
+
+def _build_combined_prompt(raw_text: str) -> _Prompt:
+    """Build the single prompt covering extraction and severity assessment."""
+    return _Prompt(_COMBINED_SYSTEM_PROMPT, raw_text)
+
+
+async def assess_and_route_claims_async(
+    batch_fnol_info: BatchFNOLInfo,
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+    semaphore: Optional[asyncio.Semaphore] = None
+) -> tuple[BatchSeverityAssessment, BatchQueueRouting]:
+    """Run Stage II and Stage III for every claim concurrently.
+    
+    Each claim is assessed with its own Gemini call and routed locally as
+    soon as its assessment arrives, so the round-trips for different claims
+    overlap instead of queuing behind each other. A semaphore caps the number
+    of in-flight requests to stay under the API rate limits. Claims with
+    identical damage and incident descriptions share a single call. Batches
+    larger than MAX_PER_CLAIM_FANOUT use one batched Stage II call instead.
     
-    # Initialize the client
-    client = genai.Client(api_key=api_key)
-    
-    # Prepare claim data for routing
-    claims_for_routing = []
-    for idx, (claim, assessment) in enumerate(zip(batch_fnol_info.claims, batch_severity.assessments)):
-        damage_location = claim.damage.location if claim.damage and claim.damage.location else "Unknown"
-        damage_desc = claim.damage.description if claim.damage else "No description"
-        
-        claim_data = {
-            "claim_id": claim.claim_id or f"CLAIM-{idx+1}",
-            "severity": assessment.severity,
-            "estimated_cost": assessment.estimated_cost,
-            "damage_location": damage_location,
-            "damage_description": damage_desc,
-            "incident_description": claim.incident_description or "No incident description"
-        }
-        claims_for_routing.append(claim_data)
-    
-    # Craft the Stage III prompt
-    prompt = f"""You are an AI claim routing system. Based on the claim information and severity assessment, assign the claim to one of the following queues: 'glass', 'fast_track', 'material_damage', or 'total_loss'.
-
-Use these rules:
-- Minor damage involving ONLY glass goes to 'glass'
-- Other Minor damage goes to 'fast_track'
-- Moderate damage goes to 'material_damage'
-- Major damage goes to 'total_loss'
-
-Also assign a priority from 1 (highest) to 5 (lowest) based on the overall situation described.
-
-Priority guidelines:
-- Priority 1: Critical/urgent (major damage, vehicle not drivable, safety concerns)
-- Priority 2: High priority (significant damage, multiple areas affected)
-- Priority 3: Medium priority (moderate damage, standard processing)
-- Priority 4: Low priority (minor damage, cosmetic issues)
-- Priority 5: Lowest priority (very minor, no safety concerns)
-
-Claims to route:
-{json.dumps(claims_for_routing, indent=2)}
-
-Return a JSON object with a "routings" array containing one routing per claim:
-{{
-  "routings": [
-    {{
-      "claim_id": "claim identifier",
-      "queue": "glass|fast_track|material_damage|total_loss",
-      "priority": 1-5,
-      "reasoning": "Brief explanation of queue and priority assignment"
-    }},
-    ...
-  ]
-}}
-
-Do not include any explanation or markdown formatting, just the raw JSON."""
+    Args:
+        batch_fnol_info: BatchFNOLInfo object with extracted claims from Stage I
+        max_workers: Maximum number of concurrent Gemini requests
+        semaphore: Optional semaphore shared with other pipelines; overrides max_workers
+        
+    Returns:
+        Tuple of (BatchSeverityAssessment, BatchQueueRouting) in claim order
+    """
+    semaphore = semaphore or asyncio.Semaphore(max_workers)
+    claims = batch_fnol_info.claims
+    
+    if len(claims) > MAX_PER_CLAIM_FANOUT:
+        # Past this size one batched call beats thousands of small ones
+        async with semaphore:
+            severity_assessment = await assess_claim_severity_async(batch_fnol_info)
+        return severity_assessment, route_claims_to_queues(batch_fnol_info, severity_assessment)
+    
+    groups: dict[tuple, asyncio.Task] = {}
+    scheduled = [(idx, claim, _schedule_claim(idx, claim, semaphore, groups)) for idx, claim in enumerate(claims)]
+    return await _collect_claim_results(scheduled)
 
-    # Generate content using Gemini 2.5 Flash
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=prompt
+
+async def _assess_and_route_claim_async(
+    idx: int,
+    claim: FNOLInfo,
+    semaphore: asyncio.Semaphore
+) -> tuple[SeverityAssessment, QueueRouting]:
+    """Assess one claim while holding the semaphore, then route it locally."""
+    async with semaphore:
+        assessment = await assess_one_claim_async(claim, idx)
+    return assessment, route_claim(claim, assessment, idx)
+
+
+def _schedule_claim(
+    idx: int,
+    claim: FNOLInfo,
+    semaphore: asyncio.Semaphore,
+    groups: dict[tuple, asyncio.Task]
+) -> asyncio.Task:
+    """Start Stages II/III for a claim, or join the task of an identical claim.
+    
+    Claims with identical damage and incident text get identical answers, so
+    only the first claim of each group is sent and its result is shared.
+    
+    Args:
+        idx: Position of the claim in its batch
+        claim: Extracted claim from Stage I
+        semaphore: Semaphore bounding in-flight Gemini requests
+        groups: Tasks already started for this batch, keyed by claim content
+        
+    Returns:
+        Task resolving to the (SeverityAssessment, QueueRouting) pair
+    """
+    key = _claim_content_key(idx, claim)
+    if key not in groups:
+        groups[key] = asyncio.create_task(_assess_and_route_claim_async(idx, claim, semaphore))
+    return groups[key]
+
+
+async def _collect_claim_results(
+    scheduled: list[tuple[int, FNOLInfo, asyncio.Task]]
+) -> tuple[BatchSeverityAssessment, BatchQueueRouting]:
+    """Wait for scheduled claims and merge their results in claim order.
+    
+    Args:
+        scheduled: (batch index, claim, task) for each claim, in claim order
+        
+    Returns:
+        Tuple of (BatchSeverityAssessment, BatchQueueRouting)
+    """
+    await asyncio.gather(*{task for _, _, task in scheduled})
+    
+    assessments = []
+    routings = []
+    for idx, claim, task in scheduled:
+        assessment, routing = task.result()
+        claim_id = claim.claim_id or f"CLAIM-{idx+1}"
+        assessments.append(assessment.model_copy(update={"claim_id": claim_id}))
+        routings.append(routing.model_copy(update={"claim_id": claim_id}))
+    
+    # Every element was validated when its response was parsed, so the
+    # containers are assembled without re-running validation
+    return (
+        BatchSeverityAssessment.model_construct(assessments=assessments),
+        BatchQueueRouting.model_construct(routings=routings)
     )
+
+
+def _print_claim(idx: int, claim: FNOLInfo) -> None:
+    """Print the summary block for one extracted claim."""
+    print(f"\n--- CLAIM {idx} ---")
+    print(f"Claim ID: {claim.claim_id or 'N/A'}")
+    print(f"Customer: {claim.policyholder_name or 'N/A'}")
+    vehicle = claim.vehicle_or_empty
+    if vehicle.year or vehicle.make or vehicle.model:
+        vehicle_str = f"{vehicle.year or ''} {vehicle.make or ''} {vehicle.model or ''}".strip()
+        print(f"Vehicle: {vehicle_str}")
+    if claim.damage and claim.damage.description:
+        print(f"Damage: {claim.damage.description[:100]}{'...' if len(claim.damage.description) > 100 else ''}")
+
+
+def _print_extraction_results(batch_info: BatchFNOLInfo) -> ValidationSummary:
+    """Print the Stage I claims and their validation summary.
     
-    # Parse the response
-    try:
-        # Clean the response text
-        response_text = response.text.strip()
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        if response_text.startswith("```"):
-            response_text = response_text[3:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-        response_text = response_text.strip()
-        
-        # Try to extract just the JSON object by finding the outermost braces
-        first_brace = response_text.find('{')
-        last_brace = response_text.rfind('}')
-        if first_brace != -1 and last_brace != -1 and last_brace > first_brace:
-            response_text = response_text[first_brace:last_brace+1]
-        
-        # Parse JSON
-        routing_data = json.loads(response_text)
-        
-        # Create BatchQueueRouting object
-        batch_routing = BatchQueueRouting(**routing_data)
-        return batch_routing
-        
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Failed to parse Stage III LLM response as JSON: {e}\nResponse: {response.text}")
-    except Exception as e:
-        raise ValueError(f"Failed to create BatchQueueRouting object: {e}")
+    Returns:
+        The validation summary from BatchFNOLInfo.validate_all()
+    """
+    print("\n" + "=" * 80)
+    print(f"STAGE I: EXTRACTED INFORMATION - {len(batch_info.claims)} CLAIMS FOUND")
+    print("=" * 80)
+    
+    for idx, claim in enumerate(batch_info.claims, 1):
+        _print_claim(idx, claim)
+    
+    return _print_validation_summary(batch_info)
+
+
+def _print_validation_summary(batch_info: BatchFNOLInfo) -> ValidationSummary:
+    """Print the Stage I validation summary and return it."""
+    print("\n" + "=" * 80)
+    print("STAGE I: VALIDATION SUMMARY")
+    print("=" * 80)
+    validation_summary = batch_info.validate_all()
+    print(f"Total Claims: {validation_summary['total_claims']}")
+    print(f"Valid Claims: {validation_summary['valid_claims']}")
+    print(f"Invalid Claims: {validation_summary['invalid_claims']}")
+    if validation_summary['invalid_claims'] > 0:
+        print("\nInvalid Claim Details:")
+        invalid_claims = zip(validation_summary['invalid_claim_ids'], validation_summary['invalid_missing_fields'])
+        for claim_id, missing_fields in invalid_claims:
+            print(f"  Claim {claim_id}: Missing fields: {', '.join(missing_fields)}")
+    return validation_summary
+
+
+def _print_severity_results(severity_assessment: BatchSeverityAssessment, summary: ValidationSummary) -> None:
+    """Print the Stage II assessments and severity statistics.
+    
+    Args:
+        severity_assessment: Stage II assessments to list
+        summary: BatchFNOLInfo.summarize() result holding the severity and cost breakdowns
+    """
+    print("\n" + "=" * 80)
+    print("STAGE II: ASSESSMENT RESULTS")
+    print("=" * 80)
+    
+    for idx, assessment in enumerate(severity_assessment.assessments, 1):
+        print(f"\n--- CLAIM {idx} ASSESSMENT ---")
+        print(f"Claim ID: {assessment.claim_id}")
+        print(f"Severity: {assessment.severity}")
+        print(f"Estimated Cost: ${assessment.estimated_cost:,.2f}")
+        if assessment.reasoning:
+            print(f"Reasoning: {assessment.reasoning}")
+    
+    print("\n" + "=" * 80)
+    print("STAGE II: SUMMARY STATISTICS")
+    print("=" * 80)
+    severity_breakdown = summary["severity_breakdown"]
+    cost_breakdown = summary["cost_breakdown"]
+    for severity in SEVERITIES:
+        print(f"{severity} Claims: {severity_breakdown[severity]} (${cost_breakdown[severity]:,.2f} estimated)")
+    print("=" * 80)
+
+
+def _print_routing_results(queue_routing: BatchQueueRouting, summary: ValidationSummary) -> None:
+    """Print the Stage III routings and queue/priority statistics.
+    
+    Args:
+        queue_routing: Stage III routings to list
+        summary: BatchFNOLInfo.summarize() result holding the queue and priority breakdowns
+    """
+    print("\n" + "=" * 80)
+    print("STAGE III: ROUTING RESULTS")
+    print("=" * 80)
+    
+    for idx, routing in enumerate(queue_routing.routings, 1):
+        print(f"\n--- CLAIM {idx} ROUTING ---")
+        print(f"Claim ID: {routing.claim_id}")
+        print(f"Queue: {routing.queue}")
+        print(f"Priority: {routing.priority}")
+        if routing.reasoning:
+            print(f"Reasoning: {routing.reasoning}")
+    
+    print("\n" + "=" * 80)
+    print("STAGE III: ROUTING STATISTICS")
+    print("=" * 80)
+    queue_breakdown = summary["queue_breakdown"]
+    print("Queue Assignments:")
+    for queue, count in queue_breakdown.items():
+        print(f"  {queue}: {count} claim(s)")
+    
+    priority_breakdown = summary["priority_breakdown"]
+    print("\nPriority Distribution:")
+    for priority in sorted(priority_breakdown.keys()):
+        count = priority_breakdown[priority]
+        print(f"  Priority {priority}: {count} claim(s)")
+    print("=" * 80)
+
+
+async def _stream_and_print_claims(
+    fnol_text: str,
+    on_claim: Optional[Callable[[int, FNOLInfo], None]] = None
+) -> BatchFNOLInfo:
+    """Run Stage I in streaming mode, printing each claim as soon as it arrives.
+    
+    Args:
+        fnol_text: Raw text containing one or more FNOL claims
+        on_claim: Optional callback invoked with (batch index, claim) for each
+            claim as soon as it has been decoded
+        
+    Returns:
+        BatchFNOLInfo with all streamed claims
+    """
+    print("\n" + "=" * 80)
+    print("STAGE I: EXTRACTED INFORMATION (STREAMING)")
+    print("=" * 80)
+    
+    claims = []
+    async for claim in stream_fnol_information_async(fnol_text):
+        claims.append(claim)
+        _print_claim(len(claims), claim)
+        if on_claim:
+            on_claim(len(claims) - 1, claim)
+    
+    print(f"\n[STAGE I] {len(claims)} CLAIMS FOUND")
+    return BatchFNOLInfo.model_construct(claims=claims)
+
+
+async def process_fnol_async(
+    fnol_text: str,
+    enable_feedback_loop: bool = False,
+    single_call: bool = False,
+    stream: bool = False,
+    semaphore: Optional[asyncio.Semaphore] = None
+) -> tuple[ValidationSummary, PipelineResult]:
+    """Run all three stages on one FNOL document and print the results.
+    
+    Args:
+        fnol_text: Raw text containing one or more FNOL claims
+        enable_feedback_loop: If True, enables LLM self-review and refinement for Stage I
+        single_call: If True, run Stages I and II in one combined Gemini call
+        stream: If True, stream Stage I and print claims as they are extracted
+        semaphore: Optional semaphore bounding Gemini requests across documents
+        
+    Returns:
+        Tuple of (BatchFNOLInfo.summarize() summary with the Stage I
+        validation and the Stage II/III breakdowns, PipelineResult). The
+        result's claims are the assessed ones, with fallback IDs pinned, so
+        they line up with the assessments and routings.
+    """
+    semaphore = semaphore or asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    
+    if (single_call or stream) and _parse_structured_input(fnol_text) is not None:
+        # Pre-extracted input has no Stage I call to stream or fuse
+        single_call = stream = False
+    
+    if single_call:
+        print("\n[STAGES I-III] Extracting and assessing in a single Gemini 2.5 Flash call, routing locally...")
+        async with semaphore:
+            result = await extract_assess_and_route_async(fnol_text)
+        batch_info, severity_assessment, queue_routing = result.to_stage_results()
+        _print_extraction_results(batch_info)
+        summary = batch_info.summarize(severity=severity_assessment, routing=queue_routing)
+        _print_severity_results(severity_assessment, summary)
+        _print_routing_results(queue_routing, summary)
+        return summary, result
+    
+    print("\n[STAGE I] Extracting information using Gemini 2.5 Flash...")
+    # In streaming mode each valid claim starts Stages II/III as soon as it is
+    # decoded, overlapping them with the rest of the Stage I generation
+    scheduled = []
+    groups: dict[tuple, asyncio.Task] = {}
+    
+    def schedule(idx: int, claim: FNOLInfo) -> None:
+        if claim.validate_required_fields()[0]:
+            scheduled.append((idx, claim, _schedule_claim(idx, claim, semaphore, groups)))
+    
+    if stream:
+        try:
+            async with semaphore:
+                batch_info = await _stream_and_print_claims(fnol_text, on_claim=schedule)
+        except BaseException:
+            for _, _, task in scheduled:
+                task.cancel()
+            raise
+        validation_summary = _print_validation_summary(batch_info)
+    else:
+        if enable_feedback_loop:
+            print("[STAGE I] Feedback loop ENABLED - LLM will review and refine extraction")
+        async with semaphore:
+            batch_info = await extract_fnol_information_batch_async(fnol_text, enable_feedback_loop=enable_feedback_loop)
+        validation_summary = _print_extraction_results(batch_info)
+    
+    # Stages II and III: each claim is assessed and routed concurrently
+    print("\n" + "=" * 80)
+    print("STAGE II & III: SEVERITY ASSESSMENT AND QUEUE ROUTING")
+    print("=" * 80)
+    
+    # Claims that failed validation are not worth Stage II/III tokens. Pin the
+    # positional fallback IDs first so they still match the Stage I numbering.
+    invalid_indexes = set(validation_summary["invalid_indices"])
+    valid_count = len(batch_info.claims) - len(invalid_indexes)
+    print(f"\n[STAGE II/III] Assessing and routing {valid_count} valid claims concurrently...")
+    if invalid_indexes:
+        skipped = ", ".join(
+            batch_info.claims[idx].claim_id or f"CLAIM-{idx+1}" for idx in sorted(invalid_indexes)
+        )
+        print(f"[STAGE II/III] Skipping {len(invalid_indexes)} invalid claim(s): {skipped}")
+    
+    valid_claims = [
+        claim if claim.claim_id else claim.model_copy(update={"claim_id": f"CLAIM-{idx+1}"})
+        for idx, claim in enumerate(batch_info.claims)
+        if idx not in invalid_indexes
+    ]
+    if stream:
+        severity_assessment, queue_routing = await _collect_claim_results(scheduled)
+    else:
+        valid_batch = BatchFNOLInfo.model_construct(claims=valid_claims)
+        severity_assessment, queue_routing = await assess_and_route_claims_async(valid_batch, semaphore=semaphore)
+    # One sweep over claims, assessments and routings for every breakdown
+    summary = batch_info.summarize(severity=severity_assessment, routing=queue_routing)
+    _print_severity_results(severity_assessment, summary)
+    _print_routing_results(queue_routing, summary)
+    # Only valid claims were assessed and routed, so the result holds those,
+    # under the same pinned IDs, to keep the three lists aligned; invalid
+    # claims are listed in the validation summary
+    result = PipelineResult.model_construct(
+        claims=valid_claims,
+        assessments=severity_assessment.assessments,
+        routings=queue_routing.routings
+    )
+    return summary, result
+
+
+# Where print output of the current asyncio task goes while process_files_async
+# buffers per-file output; None writes straight through
+_task_output: ContextVar[Optional[TextIO]] = ContextVar("task_output", default=None)
+
+
+class _TaskStdout:
+    """Stand-in for sys.stdout that sends each task's writes to its own buffer.
+    
+    Tasks inherit the buffer of the task that created them, so everything a
+    document's pipeline prints lands in that document's buffer.
+    """
+    
+    def __init__(self, stream: TextIO):
+        self._stream = stream
+    
+    def write(self, text: str) -> int:
+        return (_task_output.get() or self._stream).write(text)
+    
+    def flush(self) -> None:
+        (_task_output.get() or self._stream).flush()
+    
+    def __getattr__(self, name: str):
+        return getattr(self._stream, name)
+
+
+async def process_files_async(
+    inputs: list[tuple[str, str]],
+    enable_feedback_loop: bool = False,
+    single_call: bool = False,
+    stream: bool = False,
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+    quiet: bool = False
+) -> list:
+    """Run the pipeline for several FNOL documents concurrently.
+    
+    All documents share one semaphore, so max_workers bounds the total number
+    of in-flight Gemini requests rather than the number per document. With
+    several documents, each one's output is collected in a buffer and written
+    in one piece when it finishes, so concurrent documents never interleave,
+    even when streaming; streaming a single document prints as it goes.
+    
+    Args:
+        inputs: List of (source name, FNOL text) pairs
+        enable_feedback_loop: If True, enables LLM self-review and refinement for Stage I
+        single_call: If True, run Stages I and II in one combined Gemini call
+        stream: If True, stream Stage I and print claims as they are extracted
+        max_workers: Maximum number of concurrent Gemini requests
+        quiet: If True, discard the per-document output instead of printing it
+        
+    Returns:
+        One entry per input, in order: the (validation summary, PipelineResult)
+        tuple from process_fnol_async, or the exception that stopped that document
+    """
+    semaphore = asyncio.Semaphore(max_workers)
+    
+    async def process_file(name: str, fnol_text: str) -> tuple[ValidationSummary, PipelineResult]:
+        print("=" * 80)
+        print("STAGE I: INFORMATION EXTRACTION FROM FNOL")
+        print("=" * 80)
+        print(f"\nReading from: {name}")
+        print("\nRaw FNOL Text:")
+        print("-" * 80)
+        print(fnol_text.strip())
+        print("-" * 80)
+        return await process_fnol_async(
+            fnol_text,
+            enable_feedback_loop=enable_feedback_loop,
+            single_call=single_call,
+            stream=stream,
+            semaphore=semaphore
+        )
+    
+    async def process_file_buffered(name: str, fnol_text: str) -> tuple[ValidationSummary, PipelineResult]:
+        buffer = io.StringIO()
+        token = _task_output.set(buffer)
+        try:
+            return await process_file(name, fnol_text)
+        finally:
+            _task_output.reset(token)
+            if not quiet:
+                sys.stdout.write(buffer.getvalue())
+    
+    if not quiet and len(inputs) == 1:
+        return await asyncio.gather(
+            *(process_file(name, fnol_text) for name, fnol_text in inputs),
+            return_exceptions=True
+        )
+    with redirect_stdout(_TaskStdout(sys.stdout)):
+        return await asyncio.gather(
+            *(process_file_buffered(name, fnol_text) for name, fnol_text in inputs),
+            return_exceptions=True
+        )
+
+
+def _print_batch_summary(input_paths: list, results: list) -> None:
+    """Print validation totals aggregated across all processed files."""
+    summaries = [r[0] for r in results if not isinstance(r, BaseException)]
+    print("\n" + "=" * 80)
+    print(f"BATCH SUMMARY - {len(input_paths)} FILES")
+    print("=" * 80)
+    print(f"Files Processed: {len(summaries)}")
+    print(f"Files Failed: {len(results) - len(summaries)}")
+    print(f"Total Claims: {sum(s['total_claims'] for s in summaries)}")
+    print(f"Valid Claims: {sum(s['valid_claims'] for s in summaries)}")
+    print(f"Invalid Claims: {sum(s['invalid_claims'] for s in summaries)}")
+    print("=" * 80)
+
+
+def _truncate_to_token_budget(text: str, max_tokens: int) -> str:
+    """Cut text to roughly max_tokens, ending on a claim boundary where possible.
+    
+    Tokens are estimated as CHARS_PER_TOKEN characters each. The cut moves
+    back to the last blank line before the limit, which separates claims in
+    FNOL bundles, so no claim is sent half-written.
+    
+    Args:
+        text: Raw FNOL text
+        max_tokens: Estimated token budget for the text
+        
+    Returns:
+        The text unchanged if it fits, otherwise its truncated head
+    """
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    boundary = text.rfind("\n\n", 0, limit)
+    return text[:boundary if boundary > 0 else limit]
 
 
 def main():
     """Entry point for the application - Stage I: Information Extraction."""
-    import argparse
-    from pathlib import Path
-    
     # Set up argument parser
     parser = argparse.ArgumentParser(
         description="Extract structured information from FNOL text using LLM"
@@ -569,8 +1610,14 @@ def main():
         "--input",
         "-i",
         type=str,
-        default="inputs/sample_fnol.txt",
-        help="Path to input file containing raw FNOL text (default: inputs/sample_fnol.txt)"
+        action="append",
+        help="Path or glob pattern (quote it) of input files containing raw FNOL text; "
+             "repeat to process several (default: inputs/sample_fnol.txt)"
+    )
+    parser.add_argument(
+        "--input-dir",
+        type=str,
+        help="Directory whose *.txt files are all processed concurrently"
     )
     parser.add_argument(
         "--feedback-loop",
@@ -578,131 +1625,158 @@ def main():
         action="store_true",
         help="Enable feedback loop for Stage I extraction (LLM reviews and refines its own output)"
     )
+    parser.add_argument(
+        "--single-call",
+        action="store_true",
+        help="Run extraction and severity assessment in one combined Gemini call (cannot be combined with --feedback-loop)"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream Stage I and print each claim as soon as it is extracted (cannot be combined with --feedback-loop)"
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=MAX_CONCURRENT_REQUESTS,
+        help=f"Maximum number of concurrent Gemini requests across all files (default: {MAX_CONCURRENT_REQUESTS})"
+    )
+    parser.add_argument(
+        "--request-timeout",
+        type=float,
+        default=REQUEST_TIMEOUT_SECONDS,
+        help=f"Seconds before a Gemini request is abandoned and reissued, growing 1.5x per retry; "
+             f"0 disables (default: {REQUEST_TIMEOUT_SECONDS:.0f})"
+    )
+    parser.add_argument(
+        "--quiet",
+        "-q",
+        action="store_true",
+        help="Print only errors and the final summary, not the per-stage output"
+    )
+    parser.add_argument(
+        "--json-output",
+        action="store_true",
+        help="Print one JSON object per input file with its claims, assessments and routings "
+             "instead of the human-readable output"
+    )
+    parser.add_argument(
+        "--max-tokens",
+        type=int,
+        help=f"Truncate each input to about this many tokens (estimated as {CHARS_PER_TOKEN} characters each), "
+             "cutting at the last blank line before the limit"
+    )
+    parser.add_argument(
+        "--context-cache",
+        action="store_true",
+        help="Cache the static prompt instructions server-side with Gemini explicit context caching "
+             f"(cache names are kept in {context_cache.DEFAULT_NAMES_PATH}). Currently a no-op: every "
+             "prompt's instructions are below Gemini's 1,024-token minimum and are sent inline"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help=f"Disable the on-disk LLM response cache (default location: {llm_cache.DEFAULT_CACHE_DIR})"
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=int,
+        default=llm_cache.DEFAULT_TTL_SECONDS,
+        help=f"Lifetime of new response cache entries in seconds (default: {llm_cache.DEFAULT_TTL_SECONDS})"
+    )
     args = parser.parse_args()
+    if args.single_call and args.feedback_loop:
+        parser.error("--single-call cannot be combined with --feedback-loop")
+    if args.stream and (args.feedback_loop or args.single_call):
+        parser.error("--stream cannot be combined with --feedback-loop or --single-call")
+    if args.max_workers < 1:
+        parser.error("--max-workers must be at least 1")
+    if args.request_timeout < 0:
+        parser.error("--request-timeout cannot be negative")
+    if args.max_tokens is not None and args.max_tokens < 1:
+        parser.error("--max-tokens must be at least 1")
     
-    try:
-        # Read FNOL text from input file
-        input_path = Path(args.input)
+    global _request_timeout
+    _request_timeout = args.request_timeout
+    
+    if not args.no_cache:
+        llm_cache.enable(ttl_seconds=args.cache_ttl)
+    if args.context_cache:
+        context_cache.enable()
+    
+    input_paths = []
+    for pattern in args.input or []:
+        if not glob.has_magic(pattern):
+            input_paths.append(Path(pattern))
+            continue
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            print(f"Error: No input files match: {pattern}", file=sys.stderr)
+            sys.exit(1)
+        input_paths.extend(Path(match) for match in matches)
+    if args.input_dir:
+        input_dir = Path(args.input_dir)
+        if not input_dir.is_dir():
+            print(f"Error: Input directory not found: {input_dir}", file=sys.stderr)
+            sys.exit(1)
+        input_paths.extend(sorted(input_dir.glob("*.txt")))
+    if not input_paths and not args.input_dir:
+        input_paths = [Path("inputs/sample_fnol.txt")]
+    if not input_paths:
+        print(f"Error: No .txt files found in: {args.input_dir}", file=sys.stderr)
+        sys.exit(1)
+    
+    # Read every FNOL document up front so bad paths fail before any API call
+    inputs = []
+    for input_path in input_paths:
         if not input_path.exists():
             print(f"Error: Input file not found: {input_path}", file=sys.stderr)
             sys.exit(1)
-            
-        with open(input_path, 'r', encoding='utf-8') as f:
-            fnol_text = f.read()
+        
+        if input_path.stat().st_size > LARGE_INPUT_BYTES and args.max_tokens is None:
+            print(f"Warning: {input_path} is larger than {LARGE_INPUT_BYTES >> 20} MB; "
+                  "consider --max-tokens to bound the prompt size", file=sys.stderr)
+        fnol_text = input_path.read_text(encoding="utf-8")
         
         if not fnol_text.strip():
             print(f"Error: Input file is empty: {input_path}", file=sys.stderr)
             sys.exit(1)
-        
-        print("=" * 80)
-        print("STAGE I: INFORMATION EXTRACTION FROM FNOL")
-        print("=" * 80)
-        print(f"\nReading from: {input_path}")
-        print("\nRaw FNOL Text:")
-        print("-" * 80)
-        print(fnol_text.strip())
-        print("-" * 80)
-        
-        print("\n[STAGE I] Extracting information using Gemini 2.5 Flash...")
-        if args.feedback_loop:
-            print("[STAGE I] Feedback loop ENABLED - LLM will review and refine extraction")
-        batch_info = extract_fnol_information_batch(fnol_text, enable_feedback_loop=args.feedback_loop)
-        
-        print("\n" + "=" * 80)
-        print(f"STAGE I: EXTRACTED INFORMATION - {len(batch_info.claims)} CLAIMS FOUND")
-        print("=" * 80)
-        
-        for idx, claim in enumerate(batch_info.claims, 1):
-            print(f"\n--- CLAIM {idx} ---")
-            print(f"Claim ID: {claim.claim_id or 'N/A'}")
-            print(f"Customer: {claim.policyholder_name or 'N/A'}")
-            if claim.vehicle and (claim.vehicle.year or claim.vehicle.make or claim.vehicle.model):
-                vehicle_str = f"{claim.vehicle.year or ''} {claim.vehicle.make or ''} {claim.vehicle.model or ''}".strip()
-                print(f"Vehicle: {vehicle_str}")
-            if claim.damage and claim.damage.description:
-                print(f"Damage: {claim.damage.description[:100]}{'...' if len(claim.damage.description) > 100 else ''}")
-        
-        print("\n" + "=" * 80)
-        print("STAGE I: VALIDATION SUMMARY")
-        print("=" * 80)
-        validation_summary = batch_info.validate_all()
-        print(f"Total Claims: {validation_summary['total_claims']}")
-        print(f"Valid Claims: {validation_summary['valid_claims']}")
-        print(f"Invalid Claims: {validation_summary['invalid_claims']}")
-        if validation_summary['invalid_claims'] > 0:
-            print("\nInvalid Claim Details:")
-            for detail in validation_summary['invalid_details']:
-                print(f"  Claim {detail['claim_id']}: Missing fields: {detail['missing_fields']}")
-        
-        # Stage II: Severity Assessment
-        print("\n" + "=" * 80)
-        print("STAGE II: SEVERITY ASSESSMENT & COST ESTIMATION")
-        print("=" * 80)
-        print("\n[STAGE II] Assessing claim severity and estimating costs...")
-        
-        severity_assessment = assess_claim_severity(batch_info)
-        
-        print("\n" + "=" * 80)
-        print("STAGE II: ASSESSMENT RESULTS")
-        print("=" * 80)
-        
-        for idx, assessment in enumerate(severity_assessment.assessments, 1):
-            print(f"\n--- CLAIM {idx} ASSESSMENT ---")
-            print(f"Claim ID: {assessment.claim_id}")
-            print(f"Severity: {assessment.severity}")
-            print(f"Estimated Cost: ${assessment.estimated_cost:,.2f}")
-            if assessment.reasoning:
-                print(f"Reasoning: {assessment.reasoning}")
-        
-        print("\n" + "=" * 80)
-        print("STAGE II: SUMMARY STATISTICS")
-        print("=" * 80)
-        severity_breakdown = severity_assessment.get_severity_breakdown()
-        print(f"Minor Claims: {severity_breakdown['Minor']}")
-        print(f"Moderate Claims: {severity_breakdown['Moderate']}")
-        print(f"Major Claims: {severity_breakdown['Major']}")
-        print("=" * 80)
-        
-        # Stage III: Queue Routing
-        print("\n" + "=" * 80)
-        print("STAGE III: QUEUE ROUTING & PRIORITY ASSIGNMENT")
-        print("=" * 80)
-        print("\n[STAGE III] Routing claims to appropriate queues...")
-        
-        queue_routing = route_claims_to_queues(batch_info, severity_assessment)
-        
-        print("\n" + "=" * 80)
-        print("STAGE III: ROUTING RESULTS")
-        print("=" * 80)
-        
-        for idx, routing in enumerate(queue_routing.routings, 1):
-            print(f"\n--- CLAIM {idx} ROUTING ---")
-            print(f"Claim ID: {routing.claim_id}")
-            print(f"Queue: {routing.queue}")
-            print(f"Priority: {routing.priority}")
-            if routing.reasoning:
-                print(f"Reasoning: {routing.reasoning}")
-        
-        print("\n" + "=" * 80)
-        print("STAGE III: ROUTING STATISTICS")
-        print("=" * 80)
-        queue_breakdown = queue_routing.get_queue_breakdown()
-        print("Queue Assignments:")
-        for queue, count in queue_breakdown.items():
-            print(f"  {queue}: {count} claim(s)")
-        
-        priority_breakdown = queue_routing.get_priority_breakdown()
-        print("\nPriority Distribution:")
-        for priority in sorted(priority_breakdown.keys()):
-            count = priority_breakdown[priority]
-            print(f"  Priority {priority}: {count} claim(s)")
-        print("=" * 80)
-        
-    except ValueError as e:
-        print(f"Error: {e}", file=sys.stderr)
-        sys.exit(1)
-    except Exception as e:
-        print(f"Error processing FNOL: {e}", file=sys.stderr)
+        if args.max_tokens is not None:
+            truncated = _truncate_to_token_budget(fnol_text, args.max_tokens)
+            if len(truncated) < len(fnol_text):
+                print(f"Warning: {input_path} truncated from ~{len(fnol_text) // CHARS_PER_TOKEN} "
+                      f"to ~{len(truncated) // CHARS_PER_TOKEN} tokens", file=sys.stderr)
+                fnol_text = truncated
+        inputs.append((str(input_path), fnol_text))
+    
+    results = asyncio.run(process_files_async(
+        inputs,
+        enable_feedback_loop=args.feedback_loop,
+        single_call=args.single_call,
+        stream=args.stream,
+        max_workers=args.max_workers,
+        quiet=args.quiet or args.json_output
+    ))
+    
+    failed = False
+    for input_path, result in zip(input_paths, results):
+        if not isinstance(result, BaseException):
+            continue
+        failed = True
+        prefix = f"{input_path}: " if len(input_paths) > 1 else ""
+        if isinstance(result, ValueError):
+            print(f"Error: {prefix}{result}", file=sys.stderr)
+        else:
+            print(f"Error processing FNOL: {prefix}{result}", file=sys.stderr)
+    
+    if args.json_output:
+        for input_path, result in zip(input_paths, results):
+            if not isinstance(result, BaseException):
+                document = {"input": str(input_path), **result[1].model_dump(mode="json")}
+                sys.stdout.write(orjson.dumps(document).decode() + "\n")
+    elif len(input_paths) > 1 or args.quiet:
+        _print_batch_summary(input_paths, results)
+    if failed:
         sys.exit(1)
 
 
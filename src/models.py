@@ -1,113 +1,406 @@
 """Data models for FNOL (First Notice of Loss) information extraction."""
 
+import re
+from collections import Counter
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional, List
-from pydantic import BaseModel, Field
+from functools import cached_property, lru_cache
+from operator import attrgetter
+from typing import Annotated, Optional, List, get_args
+from pydantic import AfterValidator, BaseModel, ConfigDict, Field
+
+# Format checks for extracted values, compiled once and shared by every claim
+_VIN_RE = re.compile(r"[A-HJ-NPR-Z0-9]{17}")
+_EMAIL_RE = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+
+# Field descriptions, added to each model's JSON schema (which Gemini receives
+# as the response schema) instead of being stored in Field() on every field
+MODEL_DESCRIPTIONS: dict[str, dict[str, str]] = {
+    "VehicleInfo": {
+        "make": "Vehicle manufacturer (e.g., Toyota, Honda)",
+        "model": "Vehicle model (e.g., Camry, Civic)",
+        "year": "Vehicle year",
+        "vin": "Vehicle Identification Number",
+        "license_plate": "License plate number",
+        "color": "Vehicle color"
+    },
+    "DamageInfo": {
+        "description": "Detailed description of the damage",
+        "location": "Location on vehicle where damage occurred (e.g., front bumper, driver side door)",
+        "severity": "Severity of damage (e.g., minor, moderate, severe)",
+        "estimated_repair_cost": "Estimated cost to repair"
+    },
+    "FNOLInfo": {
+        "claim_id": "Unique claim identifier",
+        "incident_date": "Date and time of incident",
+        "incident_location": "Location where incident occurred",
+        "policyholder_name": "Name of the policyholder",
+        "contact_phone": "Contact phone number",
+        "contact_email": "Contact email address",
+        "vehicle": "Vehicle information",
+        "damage": "Damage information",
+        "incident_description": "Description of how the incident occurred",
+        "other_parties_involved": "Whether other parties were involved",
+        "police_report_filed": "Whether a police report was filed"
+    },
+    "BatchFNOLInfo": {
+        "claims": "List of extracted FNOL information"
+    },
+    "ReviewIssue": {
+        "claim_id": "ID of claim with issue",
+        "field": "Name of field with issue",
+        "issue": "Description of the problem",
+        "suggestion": "Suggested correction or addition"
+    },
+    "ExtractionReview": {
+        "feedback": "Overall assessment of the extraction quality",
+        "issues": "Problems found in the extraction",
+        "json_valid": "Whether the extracted JSON is valid",
+        "overall_quality_score": "Overall quality score from 1 to 10"
+    },
+    "SeverityAssessment": {
+        "claim_id": "Claim identifier for reference",
+        "severity": "Damage severity: Minor, Moderate, or Major",
+        "estimated_cost": "Estimated repair cost in dollars",
+        "reasoning": "Explanation for the severity classification"
+    },
+    "BatchSeverityAssessment": {
+        "assessments": "List of severity assessments"
+    },
+    "QueueRouting": {
+        "claim_id": "Claim identifier for reference",
+        "queue": "Assigned queue: glass, fast_track, material_damage, or total_loss",
+        "priority": "Priority level from 1 (highest) to 5 (lowest)",
+        "reasoning": "Explanation for the queue and priority assignment"
+    },
+    "BatchQueueRouting": {
+        "routings": "List of queue routing assignments"
+    },
+    "ExtractionAssessment": {
+        "claims": "List of extracted FNOL information",
+        "assessments": "One severity assessment per claim, in claim order"
+    },
+    "PipelineResult": {
+        "claims": "List of extracted FNOL information",
+        "assessments": "One severity assessment per claim, in claim order",
+        "routings": "One queue routing per claim, in claim order"
+    }
+}
+
+
+def _describe_fields(schema: dict, model: type) -> None:
+    """Add a model's MODEL_DESCRIPTIONS entries to its generated JSON schema."""
+    properties = schema.get("properties", {})
+    for name, description in MODEL_DESCRIPTIONS.get(model.__name__, {}).items():
+        if name in properties:
+            properties[name]["description"] = description
+
+
+# Shared by every model: extra keys the LLM adds are dropped rather than
+# rejected, and stray whitespace around extracted strings is trimmed. Models
+# are immutable once built; derive changed copies with model_copy(update=...).
+_MODEL_CONFIG = ConfigDict(
+    frozen=True,
+    extra="ignore",
+    str_strip_whitespace=True,
+    json_schema_extra=_describe_fields
+)
+
+# Breakdown keys, and the spelling each lower-cased LLM value is counted under
+SEVERITIES = ("Minor", "Moderate", "Major")
+QUEUES = ("glass", "fast_track", "material_damage", "total_loss")
+_SEVERITY_KEYS = {severity.lower(): severity for severity in SEVERITIES}
+_QUEUE_KEYS = {queue: queue for queue in QUEUES}
+
+# Known severities and queues are stored as the shared constant strings above,
+# in their canonical spelling; unknown values are kept as returned
+Severity = Annotated[str, AfterValidator(lambda value: _SEVERITY_KEYS.get(value.lower(), value))]
+Queue = Annotated[str, AfterValidator(lambda value: _QUEUE_KEYS.get(value.lower(), value))]
+
+
+class _CachingModel(BaseModel):
+    """Base for models with cached_property members.
+    
+    cached_property stores its value in the instance __dict__, which
+    model_copy would carry over, so copies made with an update drop those
+    values and recompute them from the updated fields.
+    """
+    
+    model_config = _MODEL_CONFIG
+    
+    def model_copy(self, *, update: Optional[dict] = None, deep: bool = False):
+        copied = super().model_copy(update=update, deep=deep)
+        if update:
+            for name in copied.__dict__.keys() - type(self).model_fields.keys():
+                del copied.__dict__[name]
+        return copied
 
 
 class VehicleInfo(BaseModel):
     """Information about the vehicle involved in the claim."""
     
-    make: Optional[str] = Field(None, description="Vehicle manufacturer (e.g., Toyota, Honda)")
-    model: Optional[str] = Field(None, description="Vehicle model (e.g., Camry, Civic)")
-    year: Optional[int] = Field(None, description="Vehicle year", ge=1900, le=2100)
-    vin: Optional[str] = Field(None, description="Vehicle Identification Number")
-    license_plate: Optional[str] = Field(None, description="License plate number")
-    color: Optional[str] = Field(None, description="Vehicle color")
+    model_config = _MODEL_CONFIG
+    
+    make: Optional[str] = None
+    model: Optional[str] = None
+    year: Optional[int] = Field(None, ge=1900, le=2100)
+    vin: Optional[str] = None
+    license_plate: Optional[str] = None
+    color: Optional[str] = None
 
 
 class DamageInfo(BaseModel):
     """Information about the damage reported."""
     
-    description: str = Field(..., description="Detailed description of the damage")
-    location: Optional[str] = Field(None, description="Location on vehicle where damage occurred (e.g., front bumper, driver side door)")
-    severity: Optional[str] = Field(None, description="Severity of damage (e.g., minor, moderate, severe)")
-    estimated_repair_cost: Optional[float] = Field(None, description="Estimated cost to repair", ge=0)
+    model_config = _MODEL_CONFIG
+    
+    description: str
+    location: Optional[str] = None
+    severity: Optional[str] = None
+    estimated_repair_cost: Optional[float] = Field(None, ge=0)
+
+
+# Stands in for a missing vehicle; safe to share because models are frozen
+_EMPTY_VEHICLE = VehicleInfo()
 
+# Top-level fields every claim needs; damage.description is checked separately
+_REQUIRED_FIELDS = ("incident_date", "incident_location", "policyholder_name")
+_get_required_fields = attrgetter(*_REQUIRED_FIELDS)
+_EMPTY_TUPLE: tuple[str, ...] = ()
 
-class FNOLInfo(BaseModel):
+
+class FNOLInfo(_CachingModel):
     """Structured information extracted from FNOL text."""
     
-    claim_id: Optional[str] = Field(None, description="Unique claim identifier")
-    incident_date: Optional[str] = Field(None, description="Date and time of incident")
-    incident_location: Optional[str] = Field(None, description="Location where incident occurred")
-    policyholder_name: Optional[str] = Field(None, description="Name of the policyholder")
-    contact_phone: Optional[str] = Field(None, description="Contact phone number")
-    contact_email: Optional[str] = Field(None, description="Contact email address")
-    vehicle: VehicleInfo = Field(default_factory=VehicleInfo, description="Vehicle information")
-    damage: Optional[DamageInfo] = Field(None, description="Damage information")
-    incident_description: Optional[str] = Field(None, description="Description of how the incident occurred")
-    other_parties_involved: Optional[bool] = Field(None, description="Whether other parties were involved")
-    police_report_filed: Optional[bool] = Field(None, description="Whether a police report was filed")
-    
-    def validate_required_fields(self) -> tuple[bool, list[str]]:
+    model_config = _MODEL_CONFIG
+    
+    claim_id: Optional[str] = None
+    incident_date: Optional[str] = None
+    incident_location: Optional[str] = None
+    policyholder_name: Optional[str] = None
+    contact_phone: Optional[str] = None
+    contact_email: Optional[str] = None
+    vehicle: Optional[VehicleInfo] = None
+    damage: Optional[DamageInfo] = None
+    incident_description: Optional[str] = None
+    other_parties_involved: Optional[bool] = None
+    police_report_filed: Optional[bool] = None
+    
+    @property
+    def vehicle_or_empty(self) -> VehicleInfo:
+        """The claim's vehicle, or a shared all-None VehicleInfo when none was extracted."""
+        return self.vehicle if self.vehicle is not None else _EMPTY_VEHICLE
+    
+    @cached_property
+    def required_fields_result(self) -> tuple[bool, tuple[str, ...]]:
+        """Result of validate_required_fields, computed on first access.
+        
+        Claims are frozen, so the result cannot change once computed.
+        """
+        # Most claims are complete, so check everything in one expression
+        # and only work out which fields are missing when one is
+        values = _get_required_fields(self)
+        if all(values) and self.damage and self.damage.description:
+            return True, _EMPTY_TUPLE
+        
+        missing_fields = tuple(name for name, value in zip(_REQUIRED_FIELDS, values) if not value)
+        if not (self.damage and self.damage.description):
+            missing_fields += ("damage.description",)
+        return False, missing_fields
+    
+    def validate_required_fields(self) -> tuple[bool, tuple[str, ...]]:
         """Validate that critical fields are present.
         
         Returns:
-            Tuple of (is_valid, list of missing fields)
+            Tuple of (is_valid, tuple of missing fields)
         """
-        missing_fields = []
+        return self.required_fields_result
+    
+    def malformed_fields(self) -> tuple[str, ...]:
+        """Find extracted values that do not match their expected format.
         
-        # Check critical fields
-        if not self.incident_date:
-            missing_fields.append("incident_date")
-        if not self.incident_location:
-            missing_fields.append("incident_location")
-        if not self.policyholder_name:
-            missing_fields.append("policyholder_name")
-        if not self.damage or not self.damage.description:
-            missing_fields.append("damage.description")
-            
-        return len(missing_fields) == 0, missing_fields
+        Values are kept exactly as extracted; this only reports them, so an
+        unusual VIN or email never fails or rewrites the response.
+        
+        Returns:
+            Tuple of field names ("vehicle.vin", "contact_email") whose value is malformed
+        """
+        malformed = []
+        vin = self.vehicle_or_empty.vin
+        if vin and not _VIN_RE.fullmatch(vin):
+            malformed.append("vehicle.vin")
+        if self.contact_email and not _EMAIL_RE.fullmatch(self.contact_email):
+            malformed.append("contact_email")
+        return tuple(malformed)
+
+
+@dataclass(frozen=True, slots=True)
+class InvalidClaim:
+    """A claim that failed validate_required_fields, as listed in ValidationSummary.invalid_details."""
+    
+    index: int
+    claim_id: Optional[str]
+    missing_fields: tuple[str, ...]
+
+
+class ValidationSummary(dict):
+    """Validation summary dict with invalid claims stored as parallel columns.
+    
+    "invalid_indices", "invalid_claim_ids" and "invalid_missing_fields" hold
+    one entry per invalid claim, in claim order. The invalid_details
+    property rebuilds per-claim InvalidClaim records from them on demand,
+    and summary["invalid_details"] still returns the per-claim dicts with
+    "index", "claim_id" and "missing_fields" keys.
+    """
+    
+    def __missing__(self, key: str) -> list[dict]:
+        if key != "invalid_details":
+            raise KeyError(key)
+        return [
+            {"index": detail.index, "claim_id": detail.claim_id, "missing_fields": list(detail.missing_fields)}
+            for detail in self.invalid_details
+        ]
+    
+    @property
+    def invalid_details(self) -> list[InvalidClaim]:
+        """One InvalidClaim record per invalid claim."""
+        return list(map(
+            InvalidClaim, self["invalid_indices"], self["invalid_claim_ids"], self["invalid_missing_fields"]
+        ))
+
+
+def _fold_counts(counts: Counter, keys: tuple, key_for: dict) -> dict:
+    """Fold raw value counts (or totals) into fixed breakdown keys, ignoring letter case.
+    
+    Values are counted as-is and normalized once per distinct spelling, so
+    no string is lower-cased per element. Unknown values are dropped.
+    """
+    breakdown = dict.fromkeys(keys, 0)
+    for value, count in counts.items():
+        key = key_for.get(value.lower())
+        if key is not None:
+            breakdown[key] += count
+    return breakdown
 
 
 class BatchFNOLInfo(BaseModel):
     """Container for multiple FNOL extractions."""
     
-    claims: List[FNOLInfo] = Field(default_factory=list, description="List of extracted FNOL information")
+    model_config = _MODEL_CONFIG
+    
+    claims: List[FNOLInfo] = Field(default_factory=list)
     
-    def validate_all(self) -> dict:
+    def validate_all(self) -> ValidationSummary:
         """Validate all claims and return summary.
         
         Returns:
-            Dictionary with validation summary including counts and details
+            ValidationSummary with the claim counts and the index, claim ID
+            and missing fields of each invalid claim
         """
-        total = len(self.claims)
-        valid_count = 0
-        invalid_claims = []
+        return self.summarize()
+    
+    def summarize(
+        self,
+        severity: Optional["BatchSeverityAssessment"] = None,
+        routing: Optional["BatchQueueRouting"] = None
+    ) -> ValidationSummary:
+        """Build the validation summary and any stage breakdowns in one sweep.
         
+        Each claim, assessment and routing is visited exactly once, instead of
+        once per breakdown as when calling the get_*_breakdown methods.
+        
+        Args:
+            severity: Optional Stage II assessments to add a severity breakdown for
+            routing: Optional Stage III routings to add queue and priority breakdowns for
+            
+        Returns:
+            The validate_all() summary, plus "severity_breakdown" and
+            "cost_breakdown" when severity is given, and "queue_breakdown"
+            and "priority_breakdown" when routing is
+        """
+        total = len(self.claims)
+        invalid_indices = []
+        invalid_claim_ids = []
+        invalid_missing_fields = []
         for idx, claim in enumerate(self.claims):
             is_valid, missing_fields = claim.validate_required_fields()
-            if is_valid:
-                valid_count += 1
-            else:
-                invalid_claims.append({
-                    "index": idx,
-                    "claim_id": claim.claim_id,
-                    "missing_fields": missing_fields
-                })
+            if not is_valid:
+                invalid_indices.append(idx)
+                invalid_claim_ids.append(claim.claim_id)
+                invalid_missing_fields.append(missing_fields)
         
-        return {
-            "total_claims": total,
-            "valid_claims": valid_count,
-            "invalid_claims": len(invalid_claims),
-            "invalid_details": invalid_claims
-        }
+        summary = ValidationSummary(
+            total_claims=total,
+            valid_claims=total - len(invalid_indices),
+            invalid_claims=len(invalid_indices),
+            invalid_indices=invalid_indices,
+            invalid_claim_ids=invalid_claim_ids,
+            invalid_missing_fields=invalid_missing_fields
+        )
+        if severity is not None:
+            severities = Counter()
+            costs = Counter()
+            for assessment in severity.assessments:
+                severities[assessment.severity] += 1
+                costs[assessment.severity] += assessment.estimated_cost
+            summary["severity_breakdown"] = _fold_counts(severities, SEVERITIES, _SEVERITY_KEYS)
+            summary["cost_breakdown"] = _fold_counts(costs, SEVERITIES, _SEVERITY_KEYS)
+        if routing is not None:
+            queues = Counter()
+            priorities = [0] * 6
+            for item in routing.routings:
+                queues[item.queue] += 1
+                if 1 <= item.priority <= 5:
+                    priorities[item.priority] += 1
+            summary["queue_breakdown"] = _fold_counts(queues, QUEUES, _QUEUE_KEYS)
+            summary["priority_breakdown"] = {priority: priorities[priority] for priority in range(1, 6)}
+        return summary
+
+
+class ReviewIssue(BaseModel):
+    """A single problem found while reviewing a Stage I extraction."""
+    
+    model_config = _MODEL_CONFIG
+    
+    claim_id: Optional[str] = None
+    field: Optional[str] = None
+    issue: Optional[str] = None
+    suggestion: Optional[str] = None
+
+
+class ExtractionReview(BaseModel):
+    """Quality review of a Stage I extraction produced by the feedback loop."""
+    
+    model_config = _MODEL_CONFIG
+    
+    feedback: Optional[str] = None
+    issues: List[ReviewIssue] = Field(default_factory=list)
+    json_valid: bool = True
+    overall_quality_score: int = 0
 
 
 class SeverityAssessment(BaseModel):
     """Stage II: Severity assessment and cost estimation for a claim."""
     
-    claim_id: Optional[str] = Field(None, description="Claim identifier for reference")
-    severity: str = Field(..., description="Damage severity: Minor, Moderate, or Major")
-    estimated_cost: float = Field(..., description="Estimated repair cost in dollars", ge=0)
-    reasoning: Optional[str] = Field(None, description="Explanation for the severity classification")
+    model_config = _MODEL_CONFIG
+    
+    claim_id: Optional[str] = None
+    severity: Severity
+    estimated_cost: float = Field(..., ge=0)
+    reasoning: Optional[str] = None
 
 
-class BatchSeverityAssessment(BaseModel):
+class BatchSeverityAssessment(_CachingModel):
     """Container for multiple severity assessments."""
     
-    assessments: List[SeverityAssessment] = Field(default_factory=list, description="List of severity assessments")
+    model_config = _MODEL_CONFIG
+    
+    assessments: List[SeverityAssessment] = Field(default_factory=list)
+    
+    @cached_property
+    def by_id(self) -> dict[Optional[str], SeverityAssessment]:
+        """Assessments keyed by claim_id, built on first access; the last one wins on duplicate IDs."""
+        return {assessment.claim_id: assessment for assessment in self.assessments}
     
     def get_severity_breakdown(self) -> dict:
         """Get count of claims by severity level.
@@ -115,27 +408,37 @@ class BatchSeverityAssessment(BaseModel):
         Returns:
             Dictionary with counts for each severity level
         """
-        breakdown = {"Minor": 0, "Moderate": 0, "Major": 0}
+        return _fold_counts(Counter(assessment.severity for assessment in self.assessments), SEVERITIES, _SEVERITY_KEYS)
+    
+    def get_cost_breakdown(self) -> dict:
+        """Get total estimated repair cost by severity level.
+        
+        Returns:
+            Dictionary with the summed estimated_cost for each severity level
+        """
+        costs = Counter()
         for assessment in self.assessments:
-            severity = assessment.severity.capitalize()
-            if severity in breakdown:
-                breakdown[severity] += 1
-        return breakdown
+            costs[assessment.severity] += assessment.estimated_cost
+        return _fold_counts(costs, SEVERITIES, _SEVERITY_KEYS)
 
 
 class QueueRouting(BaseModel):
     """Stage III: Queue routing and priority assignment for a claim."""
     
-    claim_id: Optional[str] = Field(None, description="Claim identifier for reference")
-    queue: str = Field(..., description="Assigned queue: glass, fast_track, material_damage, or total_loss")
-    priority: int = Field(..., description="Priority level from 1 (highest) to 5 (lowest)", ge=1, le=5)
-    reasoning: Optional[str] = Field(None, description="Explanation for the queue and priority assignment")
+    model_config = _MODEL_CONFIG
+    
+    claim_id: Optional[str] = None
+    queue: Queue
+    priority: int = Field(..., ge=1, le=5)
+    reasoning: Optional[str] = None
 
 
 class BatchQueueRouting(BaseModel):
     """Container for multiple queue routing assignments."""
     
-    routings: List[QueueRouting] = Field(default_factory=list, description="List of queue routing assignments")
+    model_config = _MODEL_CONFIG
+    
+    routings: List[QueueRouting] = Field(default_factory=list)
     
     def get_queue_breakdown(self) -> dict:
         """Get count of claims by queue.
@@ -143,12 +446,7 @@ class BatchQueueRouting(BaseModel):
         Returns:
             Dictionary with counts for each queue
         """
-        breakdown = {"glass": 0, "fast_track": 0, "material_damage": 0, "total_loss": 0}
-        for routing in self.routings:
-            queue = routing.queue.lower()
-            if queue in breakdown:
-                breakdown[queue] += 1
-        return breakdown
+        return _fold_counts(Counter(routing.queue for routing in self.routings), QUEUES, _QUEUE_KEYS)
     
     def get_priority_breakdown(self) -> dict:
         """Get count of claims by priority level.
@@ -156,8 +454,86 @@ class BatchQueueRouting(BaseModel):
         Returns:
             Dictionary with counts for each priority level
         """
-        breakdown = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
+        # Priorities are small integers, so they index a fixed list directly
+        counts = [0] * 6
         for routing in self.routings:
-            if routing.priority in breakdown:
-                breakdown[routing.priority] += 1
-        return breakdown
+            priority = routing.priority
+            if 1 <= priority <= 5:
+                counts[priority] += 1
+        return {priority: counts[priority] for priority in range(1, 6)}
+
+
+class ExtractionAssessment(BaseModel):
+    """Stages I and II output of the single-call pipeline; routing is applied locally."""
+    
+    model_config = _MODEL_CONFIG
+    
+    claims: List[FNOLInfo] = Field(default_factory=list)
+    assessments: List[SeverityAssessment] = Field(default_factory=list)
+
+
+class PipelineResult(BaseModel):
+    """Combined output of Stages I-III for one FNOL document."""
+    
+    model_config = _MODEL_CONFIG
+    
+    claims: List[FNOLInfo] = Field(default_factory=list)
+    assessments: List[SeverityAssessment] = Field(default_factory=list)
+    routings: List[QueueRouting] = Field(default_factory=list)
+    
+    def to_stage_results(self) -> tuple[BatchFNOLInfo, BatchSeverityAssessment, BatchQueueRouting]:
+        """Split the combined result into the per-stage batch containers.
+        
+        Returns:
+            Tuple of (BatchFNOLInfo, BatchSeverityAssessment, BatchQueueRouting)
+        """
+        # The lists were validated with this model, so skip re-validation
+        return (
+            BatchFNOLInfo.model_construct(claims=self.claims),
+            BatchSeverityAssessment.model_construct(assessments=self.assessments),
+            BatchQueueRouting.model_construct(routings=self.routings)
+        )
+
+
+@lru_cache(maxsize=None)
+def _nested_models(cls: type[BaseModel]) -> dict:
+    """Map each field of a model to the model class it holds (X, Optional[X], List[X]), or None."""
+    def find_model(annotation) -> Optional[type[BaseModel]]:
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            return annotation
+        for arg in get_args(annotation):
+            model = find_model(arg)
+            if model is not None:
+                return model
+        return None
+    
+    return {name: find_model(field.annotation) for name, field in cls.model_fields.items()}
+
+
+def fast_build(cls: type[BaseModel], data: dict) -> BaseModel:
+    """Build a model from trusted data without running validation.
+    
+    Like model_construct, but nested dicts and lists of dicts are built into
+    their field's model as well. Unknown keys are dropped and missing fields
+    get their defaults; values are neither checked nor coerced.
+    
+    Args:
+        cls: Model class to build
+        data: Field values, as parsed from JSON
+        
+    Returns:
+        Instance of cls
+    """
+    nested = _nested_models(cls)
+    values = {}
+    for name, value in data.items():
+        if name not in nested:
+            continue
+        model = nested[name]
+        if model is not None:
+            if isinstance(value, dict):
+                value = fast_build(model, value)
+            elif isinstance(value, list):
+                value = [fast_build(model, item) if isinstance(item, dict) else item for item in value]
+        values[name] = value
+    return cls.model_construct(**values)
@@ -0,0 +1,57 @@
+"""Tests for Gemini explicit context caching."""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, Mock
+from src import context_cache
+
+
+@pytest.fixture
+def names_path(tmp_path):
+    """Enable context caching with a temporary name map for the duration of a test."""
+    path = tmp_path / "context_caches.json"
+    context_cache.enable(path)
+    yield path
+    context_cache.disable()
+
+
+def test_cache_created_once_and_persisted(names_path):
+    """Test that a prefix is cached once and its name is reused by later runs."""
+    client = Mock()
+    client.caches.create.return_value = Mock()
+    client.caches.create.return_value.name = "cachedContents/abc"
+    
+    assert context_cache.get_cache_name(client, "gemini-2.5-flash", "prefix") == "cachedContents/abc"
+    assert context_cache.get_cache_name(client, "gemini-2.5-flash", "prefix") == "cachedContents/abc"
+    assert client.caches.create.call_count == 1
+    
+    # A new run reads the name back from disk instead of creating another cache
+    context_cache.disable()
+    context_cache.enable(names_path)
+    assert context_cache.get_cache_name(Mock(), "gemini-2.5-flash", "prefix") == "cachedContents/abc"
+
+
+def test_refused_prefix_falls_back_inline(names_path):
+    """Test that a prefix the API refuses to cache is not retried during the run."""
+    client = Mock()
+    client.caches.create.side_effect = RuntimeError("Cached content is too small")
+    
+    assert context_cache.get_cache_name(client, "gemini-2.5-flash", "prefix") is None
+    assert context_cache.get_cache_name(client, "gemini-2.5-flash", "prefix") is None
+    assert client.caches.create.call_count == 1
+    assert not names_path.exists()
+
+
+def test_concurrent_async_callers_share_one_create(names_path):
+    """Test that concurrent requests for the same prefix wait for one cache creation."""
+    client = Mock()
+    client.aio.caches.create = AsyncMock(return_value=Mock())
+    client.aio.caches.create.return_value.name = "cachedContents/abc"
+    
+    async def run():
+        return await asyncio.gather(*(
+            context_cache.get_cache_name_async(client, "gemini-2.5-flash", "prefix") for _ in range(5)
+        ))
+    
+    assert asyncio.run(run()) == ["cachedContents/abc"] * 5
+    assert client.aio.caches.create.call_count == 1
@@ -0,0 +1,40 @@
+"""Tests for the JSON helpers."""
+
+import json
+from src.json_utils import JSONArrayItemParser, looks_complete
+
+
+def test_array_item_parser_handles_arbitrary_chunk_boundaries():
+    """Test that items are emitted intact however the stream is split."""
+    document = json.dumps({
+        "claims": [
+            {"claim_id": "C001", "damage": {"description": "chip {in} \"glass\""}},
+            {"claim_id": "C002", "notes": ["a", "b]"]}
+        ]
+    })
+    
+    for chunk_size in (1, 3, 7, len(document)):
+        parser = JSONArrayItemParser()
+        items = []
+        for start in range(0, len(document), chunk_size):
+            items.extend(parser.feed(document[start:start + chunk_size]))
+        
+        assert [json.loads(item)["claim_id"] for item in items] == ["C001", "C002"]
+        assert json.loads(items[0])["damage"]["description"] == 'chip {in} "glass"'
+
+
+def test_array_item_parser_only_reads_first_array():
+    """Test that objects in later arrays are not reported."""
+    parser = JSONArrayItemParser()
+    
+    items = parser.feed('{"claims": [{"id": 1}], "assessments": [{"id": 2}]}')
+    
+    assert items == ['{"id": 1}']
+
+
+def test_looks_complete():
+    """Test the end-of-document heuristic used before parsing accumulated text."""
+    assert looks_complete('{"claims": []}\n')
+    assert looks_complete('[1, 2]')
+    assert not looks_complete('{"claims": [{"claim_id": "C0')
+    assert not looks_complete('   ')
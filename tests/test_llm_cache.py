@@ -0,0 +1,50 @@
+"""Tests for the on-disk LLM response cache."""
+
+import json
+import pytest
+from src import llm_cache
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    """Enable the cache in a temporary directory for the duration of a test."""
+    llm_cache.enable(tmp_path)
+    yield tmp_path
+    llm_cache.disable()
+
+
+def test_cache_roundtrip(cache_dir):
+    """Test that a stored response is returned for the same prompt and model."""
+    assert llm_cache.get("prompt", "gemini-2.5-flash") is None
+    
+    llm_cache.set("prompt", "gemini-2.5-flash", '{"claims": []}')
+    
+    assert llm_cache.get("prompt", "gemini-2.5-flash") == '{"claims": []}'
+    assert llm_cache.get("prompt", "other-model") is None
+    assert llm_cache.get("other prompt", "gemini-2.5-flash") is None
+
+
+def test_cache_evicts_expired_entries(cache_dir):
+    """Test that stale entries are treated as a miss and removed from disk."""
+    llm_cache.set("prompt", "gemini-2.5-flash", "response")
+    entry_path = next(cache_dir.glob("*.json"))
+    entry = json.loads(entry_path.read_text())
+    entry["expiresAt"] = 0
+    entry_path.write_text(json.dumps(entry))
+    
+    assert llm_cache.get("prompt", "gemini-2.5-flash") is None
+    assert not entry_path.exists()
+
+
+def test_cache_disabled_is_noop(tmp_path):
+    """Test that nothing is read or written while the cache is disabled."""
+    llm_cache.disable()
+    llm_cache.set("prompt", "gemini-2.5-flash", "response")
+    
+    assert llm_cache.get("prompt", "gemini-2.5-flash") is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_cache_key_fields_cannot_collide():
+    """Test that shifting text between the model and prompt fields changes the key."""
+    assert llm_cache._cache_key("b\0c", "a") != llm_cache._cache_key("c", "a\0b")
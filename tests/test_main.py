@@ -2,20 +2,36 @@
 
 import os
 import json
+import asyncio
+import httpx
 import pytest
-from unittest.mock import Mock, patch, call
+from unittest.mock import Mock, AsyncMock, patch
+from pydantic import ValidationError
+import src.main
 from src.main import (
     extract_fnol_information_batch, 
+    extract_fnol_information_batch_async,
     assess_claim_severity,
-    route_claims_to_queues
+    route_claims_to_queues,
+    assess_and_route_claims_async,
+    extract_assess_and_route_async,
+    stream_fnol_information_async,
+    process_fnol_async,
+    process_files_async
 )
 from src.models import (
     FNOLInfo, VehicleInfo, DamageInfo, BatchFNOLInfo,
     SeverityAssessment, BatchSeverityAssessment,
-    QueueRouting, BatchQueueRouting
+    QueueRouting, BatchQueueRouting, InvalidClaim, ExtractionAssessment
 )
 
 
+@pytest.fixture(autouse=True)
+def reset_shared_client(monkeypatch):
+    """Drop the cached Gemini client so each test builds its own (mocked) one."""
+    monkeypatch.setattr(src.main, "_CLIENT", None)
+
+
 def test_extract_fnol_information_batch_multiple_claims():
     """Test successful batch extraction of multiple claims."""
     mock_response = Mock()
@@ -74,7 +90,7 @@ def test_extract_fnol_information_batch_multiple_claims():
         ]
     })
     
-    with patch("src.main.genai.Client") as mock_client:
+    with patch("google.genai.Client") as mock_client:
         mock_instance = mock_client.return_value
         mock_instance.models.generate_content.return_value = mock_response
         
@@ -110,7 +126,16 @@ def test_extract_fnol_information_batch_validation():
     assert validation["total_claims"] == 2
     assert validation["valid_claims"] == 1
     assert validation["invalid_claims"] == 1
+    assert validation["invalid_indices"] == [1]
     assert len(validation["invalid_details"]) == 1
+    assert validation["invalid_details"][0]["claim_id"] == "C002"
+    assert validation.invalid_details == [
+        InvalidClaim(1, "C002", ("incident_date", "incident_location", "policyholder_name", "damage.description"))
+    ]
+    assert batch_info.claims[0].validate_required_fields() == (True, ())
+    assert batch_info.claims[1].validate_required_fields() == (
+        False, ("incident_date", "incident_location", "policyholder_name", "damage.description")
+    )
 
 
 def test_assess_claim_severity_success():
@@ -150,7 +175,7 @@ def test_assess_claim_severity_success():
         ]
     })
     
-    with patch("src.main.genai.Client") as mock_client:
+    with patch("google.genai.Client") as mock_client:
         mock_instance = mock_client.return_value
         mock_instance.models.generate_content.return_value = mock_response
         
@@ -183,6 +208,7 @@ def test_assess_claim_severity_breakdown():
     assert breakdown["Major"] == 1
     total_cost = sum(a.estimated_cost for a in assessment.assessments)
     assert total_cost == 23800.0
+    assert assessment.get_cost_breakdown() == {"Minor": 800.0, "Moderate": 3000.0, "Major": 20000.0}
 
 
 def test_assess_claim_severity_missing_api_key():
@@ -221,46 +247,15 @@ def test_route_claims_to_queues_success():
         SeverityAssessment(claim_id="C003", severity="Major", estimated_cost=25000.0)
     ])
     
-    # Mock LLM response for Stage III
-    mock_response = Mock()
-    mock_response.text = json.dumps({
-        "routings": [
-            {
-                "claim_id": "C001",
-                "queue": "glass",
-                "priority": 4,
-                "reasoning": "Minor glass-only damage"
-            },
-            {
-                "claim_id": "C002",
-                "queue": "fast_track",
-                "priority": 3,
-                "reasoning": "Minor non-glass damage"
-            },
-            {
-                "claim_id": "C003",
-                "queue": "total_loss",
-                "priority": 1,
-                "reasoning": "Major damage, total loss"
-            }
-        ]
-    })
+    result = route_claims_to_queues(batch_info, batch_severity)
     
-    with patch.dict(os.environ, {"GOOGLE_API_KEY": "test-key"}):
-        with patch("google.genai.Client") as mock_client:
-            mock_instance = Mock()
-            mock_instance.models.generate_content.return_value = mock_response
-            mock_client.return_value = mock_instance
-            
-            result = route_claims_to_queues(batch_info, batch_severity)
-            
-            assert len(result.routings) == 3
-            assert result.routings[0].claim_id == "C001"
-            assert result.routings[0].queue == "glass"
-            assert result.routings[0].priority == 4
-            assert result.routings[1].queue == "fast_track"
-            assert result.routings[2].queue == "total_loss"
-            assert result.routings[2].priority == 1
+    assert len(result.routings) == 3
+    assert result.routings[0].claim_id == "C001"
+    assert result.routings[0].queue == "glass"
+    assert result.routings[0].priority == 4
+    assert result.routings[1].queue == "fast_track"
+    assert result.routings[2].queue == "total_loss"
+    assert result.routings[2].priority == 1
 
 
 def test_route_claims_to_queues_breakdown():
@@ -286,18 +281,56 @@ def test_route_claims_to_queues_breakdown():
     assert priority_breakdown[4] == 1
 
 
-def test_route_claims_to_queues_missing_api_key():
-    """Test that ValueError is raised when API key is missing for Stage III."""
+def test_route_claims_to_queues_runs_without_api_key():
+    """Test that Stage III routing is local and needs no Gemini client."""
     batch_info = BatchFNOLInfo(claims=[
-        FNOLInfo(claim_id="C001", damage=DamageInfo(description="Test damage"))
+        FNOLInfo(damage=DamageInfo(description="Dented door", location="Driver side door")),
+        FNOLInfo(damage=DamageInfo(description="Cracked rear window", location=None))
     ])
     batch_severity = BatchSeverityAssessment(assessments=[
-        SeverityAssessment(claim_id="C001", severity="Minor", estimated_cost=100.0)
+        SeverityAssessment(severity="Moderate", estimated_cost=2000.0),
+        SeverityAssessment(severity="minor", estimated_cost=300.0)
     ])
     
     with patch.dict(os.environ, {}, clear=True):
-        with pytest.raises(ValueError, match="GOOGLE_API_KEY environment variable is not set"):
-            route_claims_to_queues(batch_info, batch_severity)
+        with patch("google.genai.Client") as mock_client:
+            result = route_claims_to_queues(batch_info, batch_severity)
+    
+    mock_client.assert_not_called()
+    assert [(r.claim_id, r.queue, r.priority) for r in result.routings] == [
+        ("CLAIM-1", "material_damage", 3),
+        ("CLAIM-2", "glass", 4)
+    ]
+
+
+def test_route_claims_to_queues_joins_assessments_by_claim_id():
+    """Test that Stage III matches assessments returned out of order to their claims."""
+    batch_info = BatchFNOLInfo(claims=[
+        FNOLInfo(claim_id="C001", damage=DamageInfo(description="Cracked windshield", location="Windshield")),
+        FNOLInfo(claim_id="C002", damage=DamageInfo(description="Vehicle totaled"))
+    ])
+    batch_severity = BatchSeverityAssessment(assessments=[
+        SeverityAssessment(claim_id="C002", severity="Major", estimated_cost=25000.0),
+        SeverityAssessment(claim_id="C001", severity="Minor", estimated_cost=300.0)
+    ])
+    
+    result = route_claims_to_queues(batch_info, batch_severity)
+    
+    assert batch_severity.by_id["C001"].severity == "Minor"
+    assert [(r.claim_id, r.queue) for r in result.routings] == [("C001", "glass"), ("C002", "total_loss")]
+
+
+def test_route_claim_glass_queue_requires_glass_only_damage():
+    """Test that only damage naming glazing alone, as a whole word, goes to the glass queue."""
+    assessment = SeverityAssessment(severity="Minor", estimated_cost=400.0)
+    
+    def queue_for(location):
+        return src.main.route_claim(FNOLInfo(damage=DamageInfo(description="Damage", location=location)), assessment).queue
+    
+    assert queue_for("Cracked windshield") == "glass"
+    assert queue_for("Rear window") == "glass"
+    assert queue_for("Windshield and rear bumper") == "fast_track"
+    assert queue_for("Fiberglass spoiler") == "fast_track"
 
 
 def test_extract_fnol_with_feedback_loop():
@@ -402,3 +435,807 @@ def test_extract_fnol_without_feedback_loop():
             # Verify only 1 LLM call was made (no feedback loop)
             assert mock_instance.models.generate_content.call_count == 1
             assert len(result.claims) == 1
+
+
+def test_assess_and_route_claims_async_runs_per_claim():
+    """Test that Stage II fans out one call per claim and keeps claim order."""
+    batch_info = BatchFNOLInfo(claims=[
+        FNOLInfo(claim_id="C001", damage=DamageInfo(description="Windshield chip", location="windshield")),
+        FNOLInfo(damage=DamageInfo(description="Airbags deployed", location="front"))
+    ])
+    
+    def fake_generate(model, contents, config=None):
+        claim_id = "C001" if '"C001"' in contents else "CLAIM-2"
+        response = Mock()
+        if "severity assessment specialist" in config["system_instruction"]:
+            severity = "Minor" if claim_id == "C001" else "Major"
+            response.text = json.dumps({"claim_id": claim_id, "severity": severity, "estimated_cost": 100.0})
+        return response
+    
+    with patch("src.main._get_client") as mock_get_client:
+        mock_generate = AsyncMock(side_effect=fake_generate)
+        mock_get_client.return_value.aio.models.generate_content = mock_generate
+        
+        severity, routing = asyncio.run(assess_and_route_claims_async(batch_info))
+    
+    # One Stage II call per claim with a single-claim schema; Stage III is local
+    assert mock_generate.call_count == 2
+    schemas = [api_call.kwargs["config"]["response_schema"] for api_call in mock_generate.call_args_list]
+    assert schemas == [SeverityAssessment.model_json_schema()] * 2
+    assert [a.claim_id for a in severity.assessments] == ["C001", "CLAIM-2"]
+    assert [a.severity for a in severity.assessments] == ["Minor", "Major"]
+    assert [r.queue for r in routing.routings] == ["glass", "total_loss"]
+
+
+def test_assess_and_route_claims_async_batches_large_inputs(monkeypatch):
+    """Test that batches above the fan-out limit use one batched Stage II call."""
+    monkeypatch.setattr("src.main.MAX_PER_CLAIM_FANOUT", 1)
+    batch_info = BatchFNOLInfo(claims=[
+        FNOLInfo(claim_id="C001", damage=DamageInfo(description="Windshield chip")),
+        FNOLInfo(claim_id="C002", damage=DamageInfo(description="Airbags deployed"))
+    ])
+    
+    def fake_generate(model, contents, config=None):
+        response = Mock()
+        response.text = json.dumps({"assessments": [
+            {"claim_id": "C001", "severity": "Minor", "estimated_cost": 100.0},
+            {"claim_id": "C002", "severity": "Major", "estimated_cost": 9000.0}
+        ]})
+        return response
+    
+    with patch("src.main._get_client") as mock_get_client:
+        mock_generate = AsyncMock(side_effect=fake_generate)
+        mock_get_client.return_value.aio.models.generate_content = mock_generate
+        
+        severity, routing = asyncio.run(assess_and_route_claims_async(batch_info))
+    
+    assert mock_generate.call_count == 1
+    assert [r.queue for r in routing.routings] == ["glass", "total_loss"]
+
+
+def test_extract_assess_and_route_single_call():
+    """Test that the combined pipeline makes one call and routes its claims locally."""
+    mock_response = Mock()
+    mock_response.text = json.dumps({
+        "claims": [{"claim_id": "C001", "damage": {"description": "Windshield chip", "location": "windshield"}}],
+        "assessments": [{"claim_id": "C001", "severity": "Minor", "estimated_cost": 200.0}],
+        # Routings from the model are ignored in favour of the local rules
+        "routings": [{"claim_id": "C001", "queue": "total_loss", "priority": 1}]
+    })
+    
+    with patch("src.main._get_client") as mock_get_client:
+        mock_generate = AsyncMock(return_value=mock_response)
+        mock_get_client.return_value.aio.models.generate_content = mock_generate
+        
+        result = asyncio.run(extract_assess_and_route_async("Test FNOL text"))
+    
+    assert mock_generate.call_count == 1
+    schema = mock_generate.call_args.kwargs["config"]["response_schema"]
+    assert schema == ExtractionAssessment.model_json_schema()
+    assert "routings" not in schema["properties"]
+    batch_info, severity, routing = result.to_stage_results()
+    assert batch_info.claims[0].claim_id == "C001"
+    assert severity.assessments[0].severity == "Minor"
+    assert [(r.queue, r.priority) for r in routing.routings] == [("glass", 4)]
+
+
+def test_extract_fnol_requests_structured_output():
+    """Test that Stage I asks for schema-constrained JSON and rejects mismatches."""
+    mock_response = Mock()
+    mock_response.text = json.dumps({"claims": [{"claim_id": "C001", "vehicle": {"year": "not a year"}}]})
+    
+    with patch.dict(os.environ, {"GOOGLE_API_KEY": "test-key"}):
+        with patch("google.genai.Client") as mock_client:
+            mock_instance = Mock()
+            mock_instance.models.generate_content.return_value = mock_response
+            mock_client.return_value = mock_instance
+            
+            with patch("src.main.time.sleep"):
+                with pytest.raises(ValueError, match="Failed to create BatchFNOLInfo object"):
+                    extract_fnol_information_batch("Test FNOL text")
+            
+            call_kwargs = mock_instance.models.generate_content.call_args.kwargs
+            config = call_kwargs["config"]
+            assert config["response_mime_type"] == "application/json"
+            assert config["response_schema"] == BatchFNOLInfo.model_json_schema()
+            # Static instructions travel as the system instruction, not in the contents
+            assert config["system_instruction"] == src.main._STAGE_I_SYSTEM_PROMPT
+            assert call_kwargs["contents"][0].parts[0].text == "Test FNOL text"
+
+
+def test_extract_fnol_retries_with_validation_feedback():
+    """Test that a schema-invalid response is retried with the error fed back to the LLM."""
+    invalid_response = Mock()
+    invalid_response.text = json.dumps({"claims": [{"claim_id": "C001", "vehicle": {"year": 1800}}]})
+    valid_response = Mock()
+    valid_response.text = json.dumps({"claims": [{"claim_id": "C001", "vehicle": {"year": 2018}}]})
+    
+    with patch.dict(os.environ, {"GOOGLE_API_KEY": "test-key"}):
+        with patch("google.genai.Client") as mock_client:
+            mock_instance = Mock()
+            mock_instance.models.generate_content.side_effect = [invalid_response, valid_response]
+            mock_client.return_value = mock_instance
+            
+            with patch("src.main.time.sleep") as mock_sleep:
+                result = extract_fnol_information_batch("Test FNOL text")
+            
+            assert result.claims[0].vehicle.year == 2018
+            assert mock_instance.models.generate_content.call_count == 2
+            mock_sleep.assert_called_once_with(1.0)
+            
+            # The retry shows the model its previous output and the validation error
+            retry_contents = mock_instance.models.generate_content.call_args.kwargs["contents"]
+            assert [turn.role for turn in retry_contents] == ["user", "model", "user"]
+            assert retry_contents[1].parts[0].text == invalid_response.text
+            assert "Your output had error" in retry_contents[2].parts[0].text
+
+
+def test_stages_share_one_client():
+    """Test that consecutive stage calls reuse a single Gemini client."""
+    batch_info = BatchFNOLInfo(claims=[
+        FNOLInfo(claim_id="C001", damage=DamageInfo(description="Windshield chip"))
+    ])
+    severity_response = Mock()
+    severity_response.text = json.dumps({"assessments": [
+        {"claim_id": "C001", "severity": "Minor", "estimated_cost": 150.0}
+    ]})
+    
+    with patch.dict(os.environ, {"GOOGLE_API_KEY": "test-key"}):
+        with patch("google.genai.Client") as mock_client:
+            mock_client.return_value.models.generate_content.return_value = severity_response
+            
+            assess_claim_severity(batch_info)
+            assess_claim_severity(batch_info)
+            
+            mock_client.assert_called_once()
+            assert mock_client.call_args.kwargs["api_key"] == "test-key"
+            http_options = mock_client.call_args.kwargs["http_options"]
+            assert http_options.client_args["limits"].max_connections == src.main.HTTP_MAX_CONNECTIONS
+            assert http_options.client_args["http2"] == src.main.HTTP2_ENABLED
+            # Async requests are pinned to an httpx transport with the same pool
+            transport = http_options.async_client_args["transport"]
+            assert isinstance(transport, httpx.AsyncHTTPTransport)
+            assert transport._pool._max_connections == src.main.HTTP_MAX_CONNECTIONS
+            assert http_options.retry_options.http_status_codes == src.main.API_RETRY_STATUS_CODES
+
+
+def test_stream_fnol_information_yields_claims_incrementally():
+    """Test that streamed Stage I output yields each claim as soon as it completes."""
+    document = json.dumps({"claims": [
+        {"claim_id": "C001", "damage": {"description": "Windshield chip"}},
+        {"claim_id": "C002", "damage": {"description": "Dented bumper"}}
+    ]})
+    split_at = document.index('{"claim_id": "C002"')
+    chunks_sent = []
+    
+    async def fake_stream():
+        for text in (document[:split_at], document[split_at:]):
+            chunks_sent.append(text)
+            yield Mock(text=text)
+    
+    async def collect():
+        # Record how many chunks had arrived when each claim was yielded
+        return [
+            (claim.claim_id, len(chunks_sent))
+            async for claim in stream_fnol_information_async("Test FNOL text")
+        ]
+    
+    with patch("src.main._get_client") as mock_get_client:
+        mock_get_client.return_value.aio.models.generate_content_stream = AsyncMock(return_value=fake_stream())
+        
+        claims = asyncio.run(collect())
+    
+    assert claims == [("C001", 1), ("C002", 2)]
+
+
+def test_process_files_async_isolates_failures():
+    """Test that files run concurrently and one failing file does not stop the others."""
+    def fake_generate(model, contents, config=None):
+        response = Mock()
+        if "severity assessment specialist" in config["system_instruction"]:
+            response.text = json.dumps({"claim_id": "C001", "severity": "Minor", "estimated_cost": 100.0})
+        elif "BROKEN" in contents:
+            raise RuntimeError("API unavailable")
+        else:
+            response.text = json.dumps({"claims": [{"claim_id": "C001", "damage": {"description": "Chip"}}]})
+        return response
+    
+    with patch("src.main._get_client") as mock_get_client:
+        mock_get_client.return_value.aio.models.generate_content = AsyncMock(side_effect=fake_generate)
+        
+        results = asyncio.run(process_files_async([("good.txt", "Claim C001"), ("bad.txt", "BROKEN")]))
+    
+    assert results[0][0]["total_claims"] == 1
+    assert isinstance(results[1], RuntimeError)
+
+
+def test_process_fnol_async_skips_invalid_claims():
+    """Test that claims failing validation are not sent to Stages II and III."""
+    def fake_generate(model, contents, config=None):
+        response = Mock()
+        if "severity assessment specialist" in config["system_instruction"]:
+            response.text = json.dumps({"claim_id": "C001", "severity": "Minor", "estimated_cost": 100.0})
+        else:
+            response.text = json.dumps({"claims": [
+                {
+                    "claim_id": "C001",
+                    "incident_date": "2024-01-15",
+                    "incident_location": "Highway 101",
+                    "policyholder_name": "John Doe",
+                    "damage": {"description": "Windshield chip"}
+                },
+                {"claim_id": "C002", "damage": {"description": "Dented door"}}
+            ]})
+        return response
+    
+    with patch("src.main._get_client") as mock_get_client:
+        mock_generate = AsyncMock(side_effect=fake_generate)
+        mock_get_client.return_value.aio.models.generate_content = mock_generate
+        
+        summary, result = asyncio.run(process_fnol_async("Claims C001 and C002"))
+    
+    assert summary["invalid_claims"] == 1
+    assert [(d.claim_id, d.missing_fields) for d in summary.invalid_details] == [
+        ("C002", ("incident_date", "incident_location", "policyholder_name"))
+    ]
+    # Stage I plus one Stage II call for the valid claim only
+    assert mock_generate.call_count == 2
+    assert all('"C002"' not in api_call.kwargs["contents"] for api_call in mock_generate.call_args_list[1:])
+    # The result lists only the assessed claims, so all three lists line up
+    assert [c.claim_id for c in result.claims] == ["C001"]
+    assert [a.claim_id for a in result.assessments] == ["C001"]
+    assert [r.claim_id for r in result.routings] == ["C001"]
+    # The printed Stage II/III statistics come from the same summary
+    assert summary["severity_breakdown"]["Minor"] == 1
+    assert summary["queue_breakdown"]["glass"] == 1
+
+
+def test_assess_and_route_claims_async_dedupes_identical_claims():
+    """Test that claims with identical damage and incident text share one Stage II call."""
+    damage = DamageInfo(description="Windshield chip", location="windshield")
+    batch_info = BatchFNOLInfo(claims=[
+        FNOLInfo(claim_id="C001", damage=damage, incident_description="Rock on highway"),
+        FNOLInfo(claim_id="C002", damage=damage, incident_description="Rock on highway")
+    ])
+    
+    def fake_generate(model, contents, config=None):
+        response = Mock()
+        response.text = json.dumps({"claim_id": "C001", "severity": "Minor", "estimated_cost": 100.0})
+        return response
+    
+    with patch("src.main._get_client") as mock_get_client:
+        mock_generate = AsyncMock(side_effect=fake_generate)
+        mock_get_client.return_value.aio.models.generate_content = mock_generate
+        
+        severity, routing = asyncio.run(assess_and_route_claims_async(batch_info))
+    
+    assert mock_generate.call_count == 1
+    assert [a.claim_id for a in severity.assessments] == ["C001", "C002"]
+    assert [r.claim_id for r in routing.routings] == ["C001", "C002"]
+    assert [r.queue for r in routing.routings] == ["glass", "glass"]
+
+
+def test_process_fnol_async_stream_overlaps_stages():
+    """Test that streaming starts Stages II/III for a claim before Stage I finishes."""
+    claim_fields = {"incident_date": "2024-01-15", "incident_location": "Highway 101", "policyholder_name": "John Doe"}
+    document = json.dumps({"claims": [
+        {"claim_id": "C001", "damage": {"description": "Windshield chip"}, **claim_fields},
+        {"claim_id": "C002", "damage": {"description": "Dented bumper"}, **claim_fields}
+    ]})
+    split_at = document.index('{"claim_id": "C002"')
+    calls_before_last_chunk = []
+    
+    def fake_generate(model, contents, config=None):
+        claim_id = "C001" if '"C001"' in contents else "C002"
+        response = Mock()
+        response.text = json.dumps({"claim_id": claim_id, "severity": "Minor", "estimated_cost": 100.0})
+        return response
+    
+    with patch("src.main._get_client") as mock_get_client:
+        mock_generate = AsyncMock(side_effect=fake_generate)
+        
+        async def fake_stream():
+            yield Mock(text=document[:split_at])
+            # Give the Stage II/III task for C001 a chance to run
+            for _ in range(5):
+                await asyncio.sleep(0)
+            calls_before_last_chunk.append(mock_generate.call_count)
+            yield Mock(text=document[split_at:])
+        
+        mock_get_client.return_value.aio.models.generate_content = mock_generate
+        mock_get_client.return_value.aio.models.generate_content_stream = AsyncMock(return_value=fake_stream())
+        
+        summary, _ = asyncio.run(process_fnol_async("Claims C001 and C002", stream=True))
+    
+    assert summary["valid_claims"] == 2
+    assert calls_before_last_chunk == [1]
+    assert mock_generate.call_count == 2
+
+
+def test_context_cache_sends_only_dynamic_suffix(tmp_path):
+    """Test that with context caching the static prefix is replaced by the cache reference."""
+    batch_info = BatchFNOLInfo(claims=[
+        FNOLInfo(claim_id="C001", damage=DamageInfo(description="Windshield chip"))
+    ])
+    severity_response = Mock()
+    severity_response.text = json.dumps({"assessments": [
+        {"claim_id": "C001", "severity": "Minor", "estimated_cost": 150.0}
+    ]})
+    
+    src.main.context_cache.enable(tmp_path / "context_caches.json")
+    try:
+        with patch("src.main._get_client") as mock_get_client:
+            mock_instance = mock_get_client.return_value
+            mock_instance.caches.create.return_value.name = "cachedContents/stage-ii"
+            mock_instance.models.generate_content.return_value = severity_response
+            
+            assess_claim_severity(batch_info)
+    finally:
+        src.main.context_cache.disable()
+    
+    call_kwargs = mock_instance.models.generate_content.call_args.kwargs
+    assert call_kwargs["config"]["cached_content"] == "cachedContents/stage-ii"
+    assert "system_instruction" not in call_kwargs["config"]
+    assert "severity assessment specialist" not in call_kwargs["contents"]
+    assert json.loads(call_kwargs["contents"])[0]["claim_id"] == "C001"
+
+
+def test_feedback_loop_skipped_when_local_checks_pass():
+    """Test that a clean extraction is returned without review or refinement calls."""
+    mock_response = Mock()
+    mock_response.text = json.dumps({
+        "claims": [
+            {
+                "claim_id": "C001",
+                "incident_date": "2024-01-15",
+                "incident_location": "Highway 101",
+                "policyholder_name": "John Smith",
+                "damage": {"description": "Cracked windshield", "location": "windshield"}
+            }
+        ]
+    })
+    
+    with patch.dict(os.environ, {"GOOGLE_API_KEY": "test-key"}):
+        with patch("google.genai.Client") as mock_client:
+            mock_client.return_value.models.generate_content.return_value = mock_response
+            
+            result = extract_fnol_information_batch("Test FNOL text", enable_feedback_loop=True)
+            
+            assert mock_client.return_value.models.generate_content.call_count == 1
+            assert result.claims[0].incident_date == "2024-01-15"
+
+
+def test_local_quality_check_flags_rule_violations():
+    """Test that event locations and cause-focused damage descriptions are flagged."""
+    batch_info = BatchFNOLInfo(claims=[
+        FNOLInfo(
+            claim_id="C001",
+            incident_date="2024-01-15",
+            incident_location="in a hailstorm",
+            policyholder_name="John Smith",
+            damage=DamageInfo(description="Someone hit my car and dented the bumper")
+        )
+    ])
+    
+    issues = src.main._local_quality_check(batch_info)
+    
+    assert [issue.field for issue in issues] == ["incident_location", "damage.description"]
+
+
+def test_local_quality_check_accepts_place_names_with_event_words():
+    """Test that real place names containing weather or event words are not flagged."""
+    batch_info = BatchFNOLInfo(claims=[
+        FNOLInfo(
+            claim_id=f"C00{n}",
+            incident_date="2024-01-15",
+            incident_location=location,
+            policyholder_name="John Smith",
+            damage=DamageInfo(description="Dented rear bumper")
+        )
+        for n, location in enumerate(["Storm Lake, IA", "Snow Hill Rd", "Accident, MD"], 1)
+    ])
+    
+    assert src.main._local_quality_check(batch_info) == []
+
+
+def test_async_feedback_loop_refines_speculatively():
+    """Test that the async loop runs review and refinement of an iteration concurrently."""
+    claim = {
+        "claim_id": "C001",
+        "incident_location": "highway",
+        "policyholder_name": "John Smith",
+        "damage": {"description": "Windshield chip"}
+    }
+    reviews = iter([
+        {"feedback": "Missing incident date", "json_valid": True, "overall_quality_score": 7},
+        {"feedback": "Complete", "json_valid": True, "overall_quality_score": 10}
+    ])
+    in_flight = 0
+    max_in_flight = 0
+    
+    async def fake_generate(model, contents, config=None):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0)
+        in_flight -= 1
+        response = Mock()
+        system_instruction = config.get("system_instruction", "")
+        if "quality assurance reviewer" in system_instruction:
+            response.text = json.dumps(next(reviews))
+        elif "refining an extraction" in system_instruction:
+            response.text = json.dumps({"claims": [{**claim, "incident_date": "2024-01-15"}]})
+        else:
+            response.text = json.dumps({"claims": [claim]})
+        return response
+    
+    with patch("src.main._get_client") as mock_get_client:
+        mock_generate = AsyncMock(side_effect=fake_generate)
+        mock_get_client.return_value.aio.models.generate_content = mock_generate
+        
+        result = asyncio.run(extract_fnol_information_batch_async("Test FNOL text", enable_feedback_loop=True))
+    
+    assert result.claims[0].incident_date == "2024-01-15"
+    assert max_in_flight == 2
+
+
+def test_async_request_reissued_after_timeout(monkeypatch):
+    """Test that a timed-out HTTP attempt is reissued with a longer per-attempt timeout."""
+    import httpx
+    monkeypatch.setattr("src.main._request_timeout", 10.0)
+    responses = iter([None, json.dumps({"claims": [{"claim_id": "C001"}]})])
+    
+    async def fake_generate(model, contents, config=None):
+        text = next(responses)
+        if text is None:
+            raise httpx.ReadTimeout("timed out")
+        return Mock(text=text)
+    
+    with patch("src.main._get_client") as mock_get_client:
+        mock_generate = AsyncMock(side_effect=fake_generate)
+        mock_get_client.return_value.aio.models.generate_content = mock_generate
+        
+        result = asyncio.run(extract_fnol_information_batch_async("Test FNOL text"))
+    
+    assert mock_generate.call_count == 2
+    timeouts = [c.kwargs["config"]["http_options"]["timeout"] for c in mock_generate.call_args_list]
+    assert timeouts == [10000, 15000]
+    assert result.claims[0].claim_id == "C001"
+
+
+def test_truncate_to_token_budget_cuts_at_claim_boundary():
+    """Test that --max-tokens truncation keeps whole claims where possible."""
+    text = "Claim C001: windshield chip\n\nClaim C002: dented bumper\n\nClaim C003: airbags deployed"
+    
+    assert src.main._truncate_to_token_budget(text, 1000) == text
+    # ~12 tokens is 48 characters: inside the second claim, so only the first is kept
+    assert src.main._truncate_to_token_budget(text, 12) == "Claim C001: windshield chip"
+    # No blank line before the limit, so the text is cut at the limit itself
+    assert src.main._truncate_to_token_budget(text, 2) == "Claim C0"
+
+
+def test_structured_json_input_skips_extraction_call():
+    """Test that pre-extracted claims JSON bypasses the Stage I LLM call."""
+    fnol_json = json.dumps({"claims": [{
+        "claim_id": "C001",
+        "incident_date": "2024-01-15",
+        "incident_location": "Highway 101",
+        "policyholder_name": "John Doe",
+        "damage": {"description": "Windshield chip", "location": "windshield"}
+    }]})
+    
+    with patch.dict(os.environ, {}, clear=True):
+        result = extract_fnol_information_batch(fnol_json)
+    assert result.claims[0].claim_id == "C001"
+    
+    def fake_generate(model, contents, config=None):
+        response = Mock()
+        response.text = json.dumps({"claim_id": "C001", "severity": "Minor", "estimated_cost": 100.0})
+        return response
+    
+    with patch("src.main._get_client") as mock_get_client:
+        mock_generate = AsyncMock(side_effect=fake_generate)
+        mock_get_client.return_value.aio.models.generate_content = mock_generate
+        
+        summary, _ = asyncio.run(process_fnol_async(fnol_json, stream=True))
+    
+    # Only the Stage II call for the claim; no Stage I request, streamed or not
+    assert summary["valid_claims"] == 1
+    assert mock_generate.call_count == 1
+    mock_get_client.return_value.aio.models.generate_content_stream.assert_not_called()
+
+
+def test_models_ignore_extra_keys_and_strip_whitespace():
+    """Test that stray LLM output keys are dropped, strings are trimmed and models are frozen."""
+    claim = FNOLInfo.model_validate_json(
+        '{"claim_id": " C001 ", "confidence": 0.9, "damage": {"description": "Chip\\n", "notes": "x"}}'
+    )
+    
+    assert claim.claim_id == "C001"
+    assert claim.damage.description == "Chip"
+    assert "confidence" not in claim.model_dump()
+    # Claims without vehicle details do not build an empty VehicleInfo
+    assert claim.vehicle is None
+    assert claim.vehicle_or_empty is FNOLInfo().vehicle_or_empty and claim.vehicle_or_empty.make is None
+    with pytest.raises(ValidationError):
+        claim.claim_id = "C002"
+
+
+def test_assess_claim_severity_dedupes_identical_claims():
+    """Test that the batched Stage II call sends each distinct claim once."""
+    damage = DamageInfo(description="Windshield chip", location="windshield")
+    batch_info = BatchFNOLInfo(claims=[
+        FNOLInfo(claim_id="C001", damage=damage),
+        FNOLInfo(damage=DamageInfo(description="Airbags deployed", location="front")),
+        FNOLInfo(claim_id="C003", damage=damage)
+    ])
+    mock_response = Mock()
+    mock_response.text = json.dumps({"assessments": [
+        {"claim_id": "C001", "severity": "Minor", "estimated_cost": 150.0},
+        {"claim_id": "CLAIM-2", "severity": "Major", "estimated_cost": 9000.0}
+    ]})
+    
+    with patch("src.main._get_client") as mock_get_client:
+        mock_generate = mock_get_client.return_value.models.generate_content
+        mock_generate.return_value = mock_response
+        
+        result = assess_claim_severity(batch_info)
+    
+    sent_claims = json.loads(mock_generate.call_args.kwargs["contents"])
+    assert [claim["claim_id"] for claim in sent_claims] == ["C001", "CLAIM-2"]
+    assert [(a.claim_id, a.severity) for a in result.assessments] == [
+        ("C001", "Minor"), ("CLAIM-2", "Major"), ("C003", "Minor")
+    ]
+
+
+def test_assess_claim_severity_dedupe_joins_assessments_by_claim_id():
+    """Test that deduplicated assessments are matched by claim ID, not response order."""
+    damage = DamageInfo(description="Windshield chip", location="windshield")
+    batch_info = BatchFNOLInfo(claims=[
+        FNOLInfo(claim_id="C001", damage=damage),
+        FNOLInfo(damage=DamageInfo(description="Airbags deployed", location="front")),
+        FNOLInfo(claim_id="C003", damage=damage)
+    ])
+    mock_response = Mock()
+    mock_response.text = json.dumps({"assessments": [
+        {"claim_id": "CLAIM-2", "severity": "Major", "estimated_cost": 9000.0},
+        {"claim_id": "C001", "severity": "Minor", "estimated_cost": 150.0}
+    ]})
+    
+    with patch("src.main._get_client") as mock_get_client:
+        mock_get_client.return_value.models.generate_content.return_value = mock_response
+        result = assess_claim_severity(batch_info)
+    
+    assert [(a.claim_id, a.severity) for a in result.assessments] == [
+        ("C001", "Minor"), ("CLAIM-2", "Major"), ("C003", "Minor")
+    ]
+
+
+def test_assess_claim_severity_dedupe_reassesses_when_an_id_is_missing():
+    """Test that a deduplicated response missing a pinned claim ID falls back to assessing every claim."""
+    damage = DamageInfo(description="Windshield chip", location="windshield")
+    batch_info = BatchFNOLInfo(claims=[
+        FNOLInfo(claim_id="C001", damage=damage),
+        FNOLInfo(claim_id="C002", damage=DamageInfo(description="Airbags deployed", location="front")),
+        FNOLInfo(claim_id="C003", damage=damage)
+    ])
+    deduped_response = Mock()
+    deduped_response.text = json.dumps({"assessments": [
+        {"claim_id": "C001", "severity": "Minor", "estimated_cost": 150.0},
+        {"claim_id": "C999", "severity": "Major", "estimated_cost": 9000.0}
+    ]})
+    full_response = Mock()
+    full_response.text = json.dumps({"assessments": [
+        {"claim_id": "C001", "severity": "Minor", "estimated_cost": 150.0},
+        {"claim_id": "C002", "severity": "Major", "estimated_cost": 9000.0},
+        {"claim_id": "C003", "severity": "Minor", "estimated_cost": 150.0}
+    ]})
+    
+    with patch("src.main._get_client") as mock_get_client:
+        mock_generate = mock_get_client.return_value.models.generate_content
+        mock_generate.side_effect = [deduped_response, full_response]
+        result = assess_claim_severity(batch_info)
+    
+    sent_claims = json.loads(mock_generate.call_args.kwargs["contents"])
+    assert [claim["claim_id"] for claim in sent_claims] == ["C001", "C002", "C003"]
+    assert [a.claim_id for a in result.assessments] == ["C001", "C002", "C003"]
+
+
+def test_process_files_async_buffers_output_per_file(capsys):
+    """Test that concurrent files print in whole blocks, even when streaming, and quiet mode prints nothing."""
+    def claims_json(contents):
+        claim_id = "C001" if "C001" in contents else "C002"
+        return json.dumps({"claims": [{
+            "claim_id": claim_id,
+            "incident_date": "2024-01-15",
+            "incident_location": "Main St",
+            "policyholder_name": "Jane Doe",
+            "damage": {"description": "Chip"}
+        }]})
+    
+    async def fake_generate(model, contents, config=None):
+        # Yield so the two files' pipelines interleave
+        await asyncio.sleep(0)
+        response = Mock()
+        if "severity assessment specialist" in config.get("system_instruction", ""):
+            claim_id = "C001" if "C001" in contents else "C002"
+            response.text = json.dumps({"claim_id": claim_id, "severity": "Minor", "estimated_cost": 100.0})
+        else:
+            response.text = claims_json(contents)
+        return response
+    
+    async def fake_generate_stream(model, contents, config=None):
+        document = claims_json(contents)
+        
+        async def chunks():
+            for start in range(0, len(document), 20):
+                await asyncio.sleep(0)
+                yield Mock(text=document[start:start + 20])
+        return chunks()
+    
+    def assert_not_interleaved(output):
+        # Everything printed for one file comes before anything printed for the other
+        a_start, b_start = output.index("Reading from: a.txt"), output.index("Reading from: b.txt")
+        split = max(a_start, b_start)
+        first_id, second_id = ("C001", "C002") if a_start < b_start else ("C002", "C001")
+        assert second_id not in output[:split]
+        assert first_id not in output[split:]
+    
+    inputs = [("a.txt", "Claim C001"), ("b.txt", "Claim C002")]
+    with patch("src.main._get_client") as mock_get_client:
+        mock_get_client.return_value.aio.models.generate_content = AsyncMock(side_effect=fake_generate)
+        mock_get_client.return_value.aio.models.generate_content_stream = AsyncMock(side_effect=fake_generate_stream)
+        
+        results = asyncio.run(process_files_async(inputs))
+        output = capsys.readouterr().out
+        asyncio.run(process_files_async(inputs, stream=True))
+        stream_output = capsys.readouterr().out
+        quiet_results = asyncio.run(process_files_async(inputs, quiet=True))
+        quiet_output = capsys.readouterr().out
+    
+    assert_not_interleaved(output)
+    assert_not_interleaved(stream_output)
+    assert [result.claims[0].claim_id for _, result in results] == ["C001", "C002"]
+    assert quiet_output == ""
+    assert [summary["total_claims"] for summary, _ in quiet_results] == [1, 1]
+
+
+def test_responses_built_without_validation_when_disabled(monkeypatch):
+    """Test that FNOL_VALIDATE=0 builds nested models from responses without validating."""
+    monkeypatch.setattr("src.main.VALIDATE_RESPONSES", False)
+    mock_response = Mock()
+    mock_response.text = json.dumps({"claims": [{
+        "claim_id": "C001",
+        "vehicle": {"make": "Toyota", "year": 2020},
+        "damage": {"description": "Windshield chip"},
+        "unexpected": "dropped"
+    }]})
+    
+    with patch("src.main._get_client") as mock_get_client:
+        mock_get_client.return_value.models.generate_content.return_value = mock_response
+        with patch("src.models.BatchFNOLInfo.model_validate_json") as mock_validate:
+            result = extract_fnol_information_batch("Claim C001")
+    
+    mock_validate.assert_not_called()
+    claim = result.claims[0]
+    assert isinstance(claim, FNOLInfo)
+    assert isinstance(claim.vehicle, VehicleInfo) and claim.vehicle.make == "Toyota"
+    assert isinstance(claim.damage, DamageInfo) and claim.damage.description == "Windshield chip"
+    assert claim.incident_date is None
+    assert "unexpected" not in claim.model_dump()
+
+
+def test_breakdowns_ignore_case_and_unknown_values():
+    """Test that breakdowns fold differently-cased values together and drop unknown ones."""
+    batch_severity = BatchSeverityAssessment(assessments=[
+        SeverityAssessment(severity=severity, estimated_cost=100.0)
+        for severity in ("minor", "MINOR", "Minor", "Major", "catastrophic")
+    ])
+    batch_routing = BatchQueueRouting(routings=[
+        QueueRouting(queue=queue, priority=4) for queue in ("Glass", "glass", "fast_track", "unknown")
+    ])
+    
+    assert batch_severity.get_severity_breakdown() == {"Minor": 3, "Moderate": 0, "Major": 1}
+    assert batch_routing.get_queue_breakdown() == {"glass": 2, "fast_track": 1, "material_damage": 0, "total_loss": 0}
+    assert [a.severity for a in batch_severity.assessments] == ["Minor", "Minor", "Minor", "Major", "catastrophic"]
+    assert [r.queue for r in batch_routing.routings] == ["glass", "glass", "fast_track", "unknown"]
+
+
+def test_model_descriptions_added_to_json_schema():
+    """Test that field descriptions still reach the response schema sent to the model."""
+    schema = BatchFNOLInfo.model_json_schema()
+    
+    assert schema["properties"]["claims"]["description"] == "List of extracted FNOL information"
+    assert schema["$defs"]["FNOLInfo"]["properties"]["claim_id"]["description"] == "Unique claim identifier"
+    assert schema["$defs"]["VehicleInfo"]["properties"]["year"]["description"] == "Vehicle year"
+
+
+def test_summarize_combines_validation_and_breakdowns():
+    """Test that summarize returns the validation summary and every stage breakdown."""
+    batch_info = BatchFNOLInfo(claims=[
+        FNOLInfo(
+            claim_id="C001", incident_date="2024-01-15", incident_location="Main St",
+            policyholder_name="John Doe", damage=DamageInfo(description="Cracked windshield")
+        ),
+        FNOLInfo(claim_id="C002")
+    ])
+    severity = BatchSeverityAssessment(assessments=[
+        SeverityAssessment(claim_id="C001", severity="minor", estimated_cost=300.0)
+    ])
+    routing = BatchQueueRouting(routings=[QueueRouting(claim_id="C001", queue="glass", priority=4)])
+    
+    summary = batch_info.summarize(severity, routing)
+    
+    assert {key: summary[key] for key in ("total_claims", "valid_claims", "invalid_claims")} == {
+        "total_claims": 2, "valid_claims": 1, "invalid_claims": 1
+    }
+    assert summary["invalid_claim_ids"] == ["C002"]
+    assert summary["severity_breakdown"] == severity.get_severity_breakdown()
+    assert summary["cost_breakdown"] == severity.get_cost_breakdown()
+    assert summary["queue_breakdown"] == routing.get_queue_breakdown()
+    assert summary["priority_breakdown"] == routing.get_priority_breakdown()
+    assert "severity_breakdown" not in batch_info.validate_all()
+
+
+def test_malformed_vin_and_email_flagged_but_kept():
+    """Test that VINs and emails are checked against their format without being rewritten."""
+    well_formed = FNOLInfo(contact_email="John.Doe@Example.COM", vehicle=VehicleInfo(vin="1HGBH41JXMN109186"))
+    malformed = FNOLInfo(contact_email="not an email", vehicle=VehicleInfo(vin="1hgbh41j-xmn 109186"))
+    
+    assert well_formed.malformed_fields() == ()
+    assert well_formed.contact_email == "John.Doe@Example.COM"
+    assert malformed.malformed_fields() == ("vehicle.vin", "contact_email")
+    assert malformed.vehicle.vin == "1hgbh41j-xmn 109186"
+    assert FNOLInfo().malformed_fields() == ()
+    
+    issues = src.main._local_quality_check(BatchFNOLInfo(claims=[malformed]))
+    assert {"vehicle.vin", "contact_email"} <= {issue.field for issue in issues}
+
+
+def test_required_fields_result_cached_and_reset_by_model_copy():
+    """Test that claim validation is computed once and recomputed for updated copies."""
+    claim = FNOLInfo(claim_id="C001")
+    
+    assert claim.validate_required_fields() is claim.validate_required_fields()
+    complete = claim.model_copy(update={
+        "incident_date": "2024-01-15",
+        "incident_location": "Main St",
+        "policyholder_name": "John Doe",
+        "damage": DamageInfo(description="Dent")
+    })
+    assert complete.validate_required_fields() == (True, ())
+    assert claim.validate_required_fields()[0] is False
+
+
+def test_invalid_responses_are_not_cached(tmp_path):
+    """Test that only a response that parses is written to the response cache."""
+    invalid_response = Mock()
+    invalid_response.text = json.dumps({"claims": [{"vehicle": {"year": "not a year"}}]})
+    valid_response = Mock()
+    valid_response.text = json.dumps({"claims": [{"claim_id": "C001"}]})
+    cache_key = src.main._contents_cache_key(*src.main._build_extraction_prompt("Claim C001"))
+    
+    src.main.llm_cache.enable(tmp_path)
+    try:
+        with patch("src.main._get_client") as mock_get_client:
+            mock_generate = mock_get_client.return_value.models.generate_content
+            mock_generate.side_effect = [invalid_response, valid_response]
+            with patch("src.main.time.sleep"):
+                extract_fnol_information_batch("Claim C001")
+            first_prompt_cached = src.main.llm_cache.get(cache_key, src.main.MODEL_NAME)
+            
+            # A rerun sends the prompt again instead of replaying the invalid reply
+            mock_generate.side_effect = [valid_response]
+            result = extract_fnol_information_batch("Claim C001")
+            rerun_cached = src.main.llm_cache.get(cache_key, src.main.MODEL_NAME)
+            
+            # Once cached, the valid reply is replayed without an API call
+            mock_generate.reset_mock()
+            extract_fnol_information_batch("Claim C001")
+    finally:
+        src.main.llm_cache.disable()
+    
+    assert first_prompt_cached is None
+    assert result.claims[0].claim_id == "C001"
+    assert rerun_cached == valid_response.text
+    mock_generate.assert_not_called()